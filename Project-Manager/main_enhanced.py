@@ -1,759 +1,725 @@
 import os
 import asyncio
-import json
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+import copy
+import functools
+import itertools
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from types import MappingProxyType
 import parlant.sdk as p
 from dotenv import load_dotenv
 from gemini_service import load_gemini_nlp_service
 
+# Optional faster event loop; asyncio's default loop is used when it isn't installed
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 
 load_dotenv()
 
+# Shared ToolResult control settings; handed to every result as-is, so never mutate them
+_SESSION_CTL = {"lifespan": "session"}
+_RESPONSE_CTL = {"lifespan": "response"}
+
+# Last formatted timestamp as (whole second, ISO string)
+_last_timestamp = (0, "")
+
+def _now_iso() -> str:
+    """Current local time as an ISO string, formatted at most once per second."""
+    global _last_timestamp
+    second = int(time.time())
+    if second != _last_timestamp[0]:
+        _last_timestamp = (second, datetime.fromtimestamp(second).isoformat())
+    return _last_timestamp[1]
+
+# Simulated id sequences for newly created issues and pull requests
+_ISSUE_IDS = itertools.count(100)
+_PR_IDS = itertools.count(200)
+
+def _tool_safe(message: str):
+    """Turn any exception raised by a tool into an error result prefixed with the message"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                return p.ToolResult(
+                    data={"error": f"{message}: {e}", "success": False},
+                    control=_RESPONSE_CTL
+                )
+        return wrapper
+    return decorator
+
+@dataclass(slots=True, frozen=True)
+class NewIssue:
+    """A simulated newly created GitHub issue, with the defaults new issues start from"""
+    id: int
+    title: str
+    description: str
+    created_at: str
+    status: str = "open"
+    assignee: str = "unassigned"
+    labels: tuple = ()
+    priority: str = "medium"
+    comments: int = 0
+
+# Simulated lookup tables, built once at import. Tool results always get deep
+# copies, so a consumer mutating one can't change what later sessions see.
+_ISSUE_DETAILS = MappingProxyType({
+    1: {
+        "id": 1,
+        "title": "Bug in authentication module",
+        "status": "open",
+        "description": "Users are experiencing login failures with social OAuth providers. The error occurs intermittently and affects approximately 15% of login attempts.",
+        "assignee": "john.doe",
+        "created_at": "2024-01-15T10:30:00Z",
+        "updated_at": "2024-01-25T16:22:00Z",
+        "priority": "high",
+        "labels": ("bug", "authentication"),
+        "comments": 8,
+        "milestone": "v2.1.0"
+    },
+    2: {
+        "id": 2,
+        "title": "Add new user dashboard feature",
+        "status": "open",
+        "description": "Create a comprehensive user dashboard with analytics, recent activity, and customizable widgets. This should improve user engagement and provide better insights.",
+        "assignee": "jane.smith",
+        "created_at": "2024-01-20T14:45:00Z",
+        "updated_at": "2024-01-24T11:30:00Z",
+        "priority": "medium",
+        "labels": ("enhancement", "frontend"),
+        "comments": 3,
+        "milestone": "v2.2.0"
+    }
+})
+
+_ALLOWED_REPOS = frozenset(("my-repo", "project-repo", "main-repo"))
+
+_OPEN_ISSUES = (
+    {
+        "id": 1,
+        "title": "Bug in authentication module",
+        "status": "open",
+        "assignee": "john.doe",
+        "created_at": "2024-01-15T10:30:00Z",
+        "priority": "high",
+        "labels": ("bug", "authentication")
+    },
+    {
+        "id": 2,
+        "title": "Add new user dashboard feature",
+        "status": "open",
+        "assignee": "jane.smith",
+        "created_at": "2024-01-20T14:45:00Z",
+        "priority": "medium",
+        "labels": ("enhancement", "frontend")
+    },
+    {
+        "id": 3,
+        "title": "Performance optimization for database queries",
+        "status": "open",
+        "assignee": "bob.wilson",
+        "created_at": "2024-01-22T09:15:00Z",
+        "priority": "low",
+        "labels": ("performance", "database")
+    }
+)
+
+_PR_DETAILS = MappingProxyType({
+    1: {
+        "id": 1,
+        "title": "Implement user authentication improvements",
+        "status": "open",
+        "description": "This PR implements several authentication improvements including OAuth2 integration, enhanced security measures, and better error handling.",
+        "author": "john.doe",
+        "created_at": "2024-01-18T12:00:00Z",
+        "updated_at": "2024-01-25T14:20:00Z",
+        "branch": "feature/auth-improvements",
+        "target_branch": "main",
+        "commits": 5,
+        "files_changed": 12,
+        "additions": 234,
+        "deletions": 89,
+        "reviews": ("approved", "pending"),
+        "checks": {"ci": "passing", "tests": "passing", "security": "passing"}
+    },
+    2: {
+        "id": 2,
+        "title": "Fix critical bug in payment processing",
+        "status": "open",
+        "description": "Urgent fix for payment processing bug that was causing transaction failures. Includes proper error handling and transaction rollback mechanisms.",
+        "author": "jane.smith",
+        "created_at": "2024-01-22T09:30:00Z",
+        "updated_at": "2024-01-24T16:45:00Z",
+        "branch": "hotfix/payment-bug",
+        "target_branch": "main",
+        "commits": 2,
+        "files_changed": 3,
+        "additions": 45,
+        "deletions": 12,
+        "reviews": ("approved",),
+        "checks": {"ci": "passing", "tests": "passing", "security": "passing"}
+    }
+})
+
+# Simulated sandbox outcomes; each run copies one and adds its own log URL
+_TESTS_OK = {
+    "success": True,
+    "tests_run": 45,
+    "tests_passed": 45,
+    "tests_failed": 0,
+    "duration": "2m 34s",
+    "coverage": "87%"
+}
+
+_TESTS_FAIL = {
+    "success": False,
+    "tests_run": 45,
+    "tests_passed": 42,
+    "tests_failed": 3,
+    "failed_tests": (
+        "tests/test_authentication.py::test_oauth_login",
+        "tests/test_payment.py::test_invalid_card",
+        "tests/test_database.py::test_connection_timeout"
+    ),
+    "duration": "2m 12s",
+    "coverage": "82%"
+}
+
+_SEARCH_RESULTS = (
+    {
+        "id": "doc-auth-001",
+        "score": 0.95,
+        "title": "Authentication Module Documentation",
+        "snippet": "OAuth2 implementation with proper error handling. Common issues: token expiration, invalid client credentials.",
+        "type": "documentation",
+        "file_path": "docs/authentication.md"
+    },
+    {
+        "id": "code-auth-002",
+        "score": 0.89,
+        "title": "Authentication Service Class",
+        "snippet": "def handle_oauth_login(self, provider, token): if not token: raise AuthError('Invalid token') ...",
+        "type": "code",
+        "file_path": "src/auth/service.py"
+    },
+    {
+        "id": "issue-auth-003",
+        "score": 0.84,
+        "title": "Similar Issue Resolution",
+        "snippet": "Fixed similar OAuth login failures by updating token validation logic and improving error messages.",
+        "type": "issue",
+        "file_path": "issues/resolved/auth-fix-234.md"
+    },
+    {
+        "id": "test-auth-004",
+        "score": 0.78,
+        "title": "Authentication Test Cases",
+        "snippet": "Test cases covering OAuth flow, token validation, and error scenarios. Includes mock providers setup.",
+        "type": "test",
+        "file_path": "tests/test_authentication.py"
+    }
+)
+
+def _bulk_lookup(table, repo: str, ids: list[int]) -> tuple[dict, list[int]]:
+    """Copies of the entries for ids, keyed by id, plus the ids that weren't found.
+    
+    Simulates a single batched fetch (one GraphQL query against the real API)
+    instead of one request per id. Keys are strings so the map survives JSON
+    serialization unchanged; unknown repositories have no entries at all.
+    """
+    if repo.lower() not in _ALLOWED_REPOS:
+        return {}, list(ids)
+    found = {}
+    not_found = []
+    for item_id in ids:
+        entry = table.get(item_id)
+        if entry:
+            found[str(item_id)] = copy.deepcopy(entry)
+        else:
+            not_found.append(item_id)
+    return found, not_found
+
 # Enhanced GitHub API Tools with proper error handling and data structure
 @p.tool
+@_tool_safe("Failed to fetch issues")
 async def github_list_open_issues(context: p.ToolContext, repo: str) -> p.ToolResult:
     """List all open issues in a GitHub repository"""
-    try:
-        # Simulate fetching open issues from a GitHub repository
-        issues = [
-            {
-                "id": 1,
-                "title": "Bug in authentication module",
-                "status": "open",
-                "assignee": "john.doe",
-                "created_at": "2024-01-15T10:30:00Z",
-                "priority": "high",
-                "labels": ["bug", "authentication"]
-            },
-            {
-                "id": 2,
-                "title": "Add new user dashboard feature",
-                "status": "open",
-                "assignee": "jane.smith",
-                "created_at": "2024-01-20T14:45:00Z",
-                "priority": "medium",
-                "labels": ["enhancement", "frontend"]
-            },
-            {
-                "id": 3,
-                "title": "Performance optimization for database queries",
-                "status": "open",
-                "assignee": "bob.wilson",
-                "created_at": "2024-01-22T09:15:00Z",
-                "priority": "low",
-                "labels": ["performance", "database"]
-            }
-        ]
-        
-        # Filter by repository context
-        filtered_issues = [issue for issue in issues if repo.lower() in ["my-repo", "project-repo", "main-repo"]]
-        
-        return p.ToolResult(
-            data={
-                "repository": repo,
-                "count": len(filtered_issues),
-                "issues": filtered_issues,
-                "success": True
-            },
-            control={"lifespan": "session"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Failed to fetch issues: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    # Simulate fetching open issues; only known repositories have any
+    filtered_issues = _OPEN_ISSUES if repo.lower() in _ALLOWED_REPOS else ()
+    
+    return p.ToolResult(
+        data={
+            "repository": repo,
+            "count": len(filtered_issues),
+            "issues": copy.deepcopy(filtered_issues),
+            "success": True
+        },
+        control=_SESSION_CTL
+    )
 
 @p.tool
+@_tool_safe("Failed to fetch issue details")
 async def github_get_issue_details(context: p.ToolContext, issue_id: int) -> p.ToolResult:
     """Get detailed information about a specific GitHub issue"""
-    try:
-        # Simulate fetching detailed issue information
-        issue_details = {
-            1: {
-                "id": 1,
-                "title": "Bug in authentication module",
-                "status": "open",
-                "description": "Users are experiencing login failures with social OAuth providers. The error occurs intermittently and affects approximately 15% of login attempts.",
-                "assignee": "john.doe",
-                "created_at": "2024-01-15T10:30:00Z",
-                "updated_at": "2024-01-25T16:22:00Z",
-                "priority": "high",
-                "labels": ["bug", "authentication"],
-                "comments": 8,
-                "milestone": "v2.1.0"
-            },
-            2: {
-                "id": 2,
-                "title": "Add new user dashboard feature",
-                "status": "open",
-                "description": "Create a comprehensive user dashboard with analytics, recent activity, and customizable widgets. This should improve user engagement and provide better insights.",
-                "assignee": "jane.smith",
-                "created_at": "2024-01-20T14:45:00Z",
-                "updated_at": "2024-01-24T11:30:00Z",
-                "priority": "medium",
-                "labels": ["enhancement", "frontend"],
-                "comments": 3,
-                "milestone": "v2.2.0"
-            }
-        }
-        
-        issue = issue_details.get(issue_id)
-        if not issue:
-            return p.ToolResult(
-                data={"error": f"Issue #{issue_id} not found", "success": False},
-                control={"lifespan": "response"}
-            )
-            
-        return p.ToolResult(data={**issue, "success": True}, control={"lifespan": "session"})
-    except Exception as e:
+    # Simulate fetching detailed issue information
+    issue = _ISSUE_DETAILS.get(issue_id)
+    if not issue:
         return p.ToolResult(
-            data={"error": f"Failed to fetch issue details: {str(e)}", "success": False},
-            control={"lifespan": "response"}
+            data={"error": f"Issue #{issue_id} not found", "success": False},
+            control=_RESPONSE_CTL
         )
+        
+    data = copy.deepcopy(issue)
+    data["success"] = True
+    return p.ToolResult(data=data, control=_SESSION_CTL)
 
 @p.tool
+@_tool_safe("Failed to fetch issue details")
+async def github_get_issues_bulk(context: p.ToolContext, repo: str, issue_ids: list[int]) -> p.ToolResult:
+    """Get detailed information about several GitHub issues in one call"""
+    issues, not_found = _bulk_lookup(_ISSUE_DETAILS, repo, issue_ids)
+    
+    return p.ToolResult(
+        data={
+            "repository": repo,
+            "count": len(issues),
+            "issues": issues,
+            "not_found": not_found,
+            "success": True
+        },
+        control=_SESSION_CTL
+    )
+
+@p.tool
+@_tool_safe("Failed to create issue")
 async def github_create_issue(context: p.ToolContext, title: str, description: str) -> p.ToolResult:
     """Create a new issue in a GitHub repository"""
-    try:
-        # Simulate creating a new issue
-        new_issue = {
-            "id": 100 + len(title),  # Simple ID generation
-            "title": title,
-            "description": description,
-            "status": "open",
-            "assignee": "unassigned",
-            "created_at": datetime.now().isoformat(),
-            "labels": [],
-            "priority": "medium",
-            "comments": 0
-        }
-        
-        return p.ToolResult(
-            data={**new_issue, "success": True, "message": f"Issue '{title}' created successfully"},
-            control={"lifespan": "session"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Failed to create issue: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    # Simulate creating a new issue
+    new_issue = NewIssue(id=next(_ISSUE_IDS), title=title, description=description, created_at=_now_iso())
+    
+    data = asdict(new_issue)
+    data["success"] = True
+    data["message"] = f"Issue '{title}' created successfully"
+    return p.ToolResult(data=data, control=_SESSION_CTL)
 
 @p.tool
+@_tool_safe("Failed to close issue")
 async def github_close_issue(context: p.ToolContext, issue_id: int) -> p.ToolResult:
     """Close an existing GitHub issue"""
-    try:
-        return p.ToolResult(
-            data={
-                "id": issue_id,
-                "status": "closed",
-                "closed_at": datetime.now().isoformat(),
-                "reason": "resolved",
-                "success": True,
-                "message": f"Issue #{issue_id} closed successfully"
-            },
-            control={"lifespan": "session"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Failed to close issue: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    return p.ToolResult(
+        data={
+            "id": issue_id,
+            "status": "closed",
+            "closed_at": _now_iso(),
+            "reason": "resolved",
+            "success": True,
+            "message": f"Issue #{issue_id} closed successfully"
+        },
+        control=_SESSION_CTL
+    )
 
 @p.tool
+@_tool_safe("Failed to reopen issue")
 async def github_reopen_issue(context: p.ToolContext, issue_id: int) -> p.ToolResult:
     """Reopen a previously closed GitHub issue"""
-    try:
-        return p.ToolResult(
-            data={
-                "id": issue_id,
-                "status": "reopened",
-                "reopened_at": datetime.now().isoformat(),
-                "success": True,
-                "message": f"Issue #{issue_id} reopened successfully"
-            },
-            control={"lifespan": "session"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Failed to reopen issue: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    return p.ToolResult(
+        data={
+            "id": issue_id,
+            "status": "reopened",
+            "reopened_at": _now_iso(),
+            "success": True,
+            "message": f"Issue #{issue_id} reopened successfully"
+        },
+        control=_SESSION_CTL
+    )
 
 @p.tool
+@_tool_safe("Failed to fetch pull requests")
 async def github_list_pull_requests(context: p.ToolContext, repo: str) -> p.ToolResult:
     """List pull requests in a GitHub repository"""
-    try:
-        pull_requests = [
-            {
-                "id": 1,
-                "title": "Implement user authentication improvements",
-                "status": "open",
-                "author": "john.doe",
-                "created_at": "2024-01-18T12:00:00Z",
-                "branch": "feature/auth-improvements",
-                "target_branch": "main",
-                "commits": 5,
-                "files_changed": 12,
-                "additions": 234,
-                "deletions": 89
-            },
-            {
-                "id": 2,
-                "title": "Fix critical bug in payment processing",
-                "status": "open",
-                "author": "jane.smith",
-                "created_at": "2024-01-22T09:30:00Z",
-                "branch": "hotfix/payment-bug",
-                "target_branch": "main",
-                "commits": 2,
-                "files_changed": 3,
-                "additions": 45,
-                "deletions": 12
-            }
-        ]
-        
-        return p.ToolResult(
-            data={
-                "repository": repo,
-                "count": len(pull_requests),
-                "pull_requests": pull_requests,
-                "success": True
-            },
-            control={"lifespan": "session"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Failed to fetch pull requests: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    pull_requests = [
+        {
+            "id": 1,
+            "title": "Implement user authentication improvements",
+            "status": "open",
+            "author": "john.doe",
+            "created_at": "2024-01-18T12:00:00Z",
+            "branch": "feature/auth-improvements",
+            "target_branch": "main",
+            "commits": 5,
+            "files_changed": 12,
+            "additions": 234,
+            "deletions": 89
+        },
+        {
+            "id": 2,
+            "title": "Fix critical bug in payment processing",
+            "status": "open",
+            "author": "jane.smith",
+            "created_at": "2024-01-22T09:30:00Z",
+            "branch": "hotfix/payment-bug",
+            "target_branch": "main",
+            "commits": 2,
+            "files_changed": 3,
+            "additions": 45,
+            "deletions": 12
+        }
+    ]
+    
+    return p.ToolResult(
+        data={
+            "repository": repo,
+            "count": len(pull_requests),
+            "pull_requests": pull_requests,
+            "success": True
+        },
+        control=_SESSION_CTL
+    )
 
 @p.tool
+@_tool_safe("Failed to fetch PR details")
 async def github_get_pull_request_details(context: p.ToolContext, pr_id: int) -> p.ToolResult:
     """Get detailed information about a specific pull request"""
-    try:
-        pr_details = {
-            1: {
-                "id": 1,
-                "title": "Implement user authentication improvements",
-                "status": "open",
-                "description": "This PR implements several authentication improvements including OAuth2 integration, enhanced security measures, and better error handling.",
-                "author": "john.doe",
-                "created_at": "2024-01-18T12:00:00Z",
-                "updated_at": "2024-01-25T14:20:00Z",
-                "branch": "feature/auth-improvements",
-                "target_branch": "main",
-                "commits": 5,
-                "files_changed": 12,
-                "additions": 234,
-                "deletions": 89,
-                "reviews": ["approved", "pending"],
-                "checks": {"ci": "passing", "tests": "passing", "security": "passing"}
-            },
-            2: {
-                "id": 2,
-                "title": "Fix critical bug in payment processing",
-                "status": "open",
-                "description": "Urgent fix for payment processing bug that was causing transaction failures. Includes proper error handling and transaction rollback mechanisms.",
-                "author": "jane.smith",
-                "created_at": "2024-01-22T09:30:00Z",
-                "updated_at": "2024-01-24T16:45:00Z",
-                "branch": "hotfix/payment-bug",
-                "target_branch": "main",
-                "commits": 2,
-                "files_changed": 3,
-                "additions": 45,
-                "deletions": 12,
-                "reviews": ["approved"],
-                "checks": {"ci": "passing", "tests": "passing", "security": "passing"}
-            }
-        }
-        
-        pr = pr_details.get(pr_id)
-        if not pr:
-            return p.ToolResult(
-                data={"error": f"Pull request #{pr_id} not found", "success": False},
-                control={"lifespan": "response"}
-            )
-            
-        return p.ToolResult(data={**pr, "success": True}, control={"lifespan": "session"})
-    except Exception as e:
+    pr = _PR_DETAILS.get(pr_id)
+    if not pr:
         return p.ToolResult(
-            data={"error": f"Failed to fetch PR details: {str(e)}", "success": False},
-            control={"lifespan": "response"}
+            data={"error": f"Pull request #{pr_id} not found", "success": False},
+            control=_RESPONSE_CTL
         )
+        
+    data = copy.deepcopy(pr)
+    data["success"] = True
+    return p.ToolResult(data=data, control=_SESSION_CTL)
+
+@p.tool
+@_tool_safe("Failed to fetch PR details")
+async def github_get_pull_requests_bulk(context: p.ToolContext, repo: str, pr_ids: list[int]) -> p.ToolResult:
+    """Get detailed information about several pull requests in one call"""
+    pull_requests, not_found = _bulk_lookup(_PR_DETAILS, repo, pr_ids)
+    
+    return p.ToolResult(
+        data={
+            "repository": repo,
+            "count": len(pull_requests),
+            "pull_requests": pull_requests,
+            "not_found": not_found,
+            "success": True
+        },
+        control=_SESSION_CTL
+    )
 
 @p.tool
+@_tool_safe("Failed to create PR")
 async def github_create_pull_request(context: p.ToolContext, title: str, description: str, branch: str, target_branch: str = "main") -> p.ToolResult:
     """Create a new pull request in a GitHub repository"""
-    try:
-        new_pr = {
-            "id": 200 + len(title),  # Simple ID generation
-            "title": title,
-            "description": description,
-            "status": "open",
-            "author": "dev-agent",
-            "created_at": datetime.now().isoformat(),
-            "branch": branch,
-            "target_branch": target_branch,
-            "commits": 1,
-            "files_changed": 1,
-            "additions": 50,
-            "deletions": 10
-        }
-        
-        return p.ToolResult(
-            data={**new_pr, "success": True, "message": f"Pull request '{title}' created successfully"},
-            control={"lifespan": "session"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Failed to create PR: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    new_pr = {
+        "id": next(_PR_IDS),
+        "title": title,
+        "description": description,
+        "status": "open",
+        "author": "dev-agent",
+        "created_at": _now_iso(),
+        "branch": branch,
+        "target_branch": target_branch,
+        "commits": 1,
+        "files_changed": 1,
+        "additions": 50,
+        "deletions": 10,
+        "success": True,
+        "message": f"Pull request '{title}' created successfully"
+    }
+    
+    return p.ToolResult(
+        data=new_pr,
+        control=_SESSION_CTL
+    )
 
 @p.tool
+@_tool_safe("Failed to merge PR")
 async def github_merge_pull_request(context: p.ToolContext, pr_id: int, merge_method: str = "merge") -> p.ToolResult:
     """Merge a pull request in a GitHub repository"""
-    try:
-        return p.ToolResult(
-            data={
-                "id": pr_id,
-                "status": "merged",
-                "merged_at": datetime.now().isoformat(),
-                "merge_method": merge_method,
-                "success": True,
-                "message": f"Pull request #{pr_id} merged successfully"
-            },
-            control={"lifespan": "session"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Failed to merge PR: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    return p.ToolResult(
+        data={
+            "id": pr_id,
+            "status": "merged",
+            "merged_at": _now_iso(),
+            "merge_method": merge_method,
+            "success": True,
+            "message": f"Pull request #{pr_id} merged successfully"
+        },
+        control=_SESSION_CTL
+    )
 
 @p.tool
+@_tool_safe("Failed to close PR")
 async def github_close_pull_request(context: p.ToolContext, pr_id: int) -> p.ToolResult:
     """Close a pull request without merging"""
-    try:
-        return p.ToolResult(
-            data={
-                "id": pr_id,
-                "status": "closed",
-                "closed_at": datetime.now().isoformat(),
-                "reason": "declined",
-                "success": True,
-                "message": f"Pull request #{pr_id} closed"
-            },
-            control={"lifespan": "session"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Failed to close PR: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    return p.ToolResult(
+        data={
+            "id": pr_id,
+            "status": "closed",
+            "closed_at": _now_iso(),
+            "reason": "declined",
+            "success": True,
+            "message": f"Pull request #{pr_id} closed"
+        },
+        control=_SESSION_CTL
+    )
 
 @p.tool
+@_tool_safe("Test execution failed")
 async def sandbox_run_tests(context: p.ToolContext, repo: str, commit_sha: str) -> p.ToolResult:
     """Run tests in a sandboxed environment"""
-    try:
-        # Simulate test execution
-        import random
-        success = random.choice([True, False])  # Random success/failure for demo
-        
-        if success:
-            results = {
-                "success": True,
-                "tests_run": 45,
-                "tests_passed": 45,
-                "tests_failed": 0,
-                "duration": "2m 34s",
-                "coverage": "87%",
-                "log_url": f"https://internal-logs.example/run/{commit_sha[:8]}"
-            }
-        else:
-            results = {
-                "success": False,
-                "tests_run": 45,
-                "tests_passed": 42,
-                "tests_failed": 3,
-                "failed_tests": [
-                    "tests/test_authentication.py::test_oauth_login",
-                    "tests/test_payment.py::test_invalid_card",
-                    "tests/test_database.py::test_connection_timeout"
-                ],
-                "duration": "2m 12s",
-                "coverage": "82%",
-                "log_url": f"https://internal-logs.example/run/{commit_sha[:8]}"
-            }
-        
-        return p.ToolResult(data=results, control={"lifespan": "response"})
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Test execution failed: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    # Simulate test execution
+    template = _TESTS_OK if random.getrandbits(1) else _TESTS_FAIL  # Random success/failure for demo
+    results = copy.deepcopy(template)
+    results["log_url"] = f"https://internal-logs.example/run/{commit_sha[:8]}"
+    
+    return p.ToolResult(data=results, control=_RESPONSE_CTL)
 
 @p.tool
+@_tool_safe("Search failed")
 async def vector_retriever_search(context: p.ToolContext, query: str, top_k: int = 5) -> p.ToolResult:
     """Search for relevant documentation and code snippets using vector search"""
-    try:
-        # Simulate semantic search results
-        search_results = [
-            {
-                "id": "doc-auth-001",
-                "score": 0.95,
-                "title": "Authentication Module Documentation",
-                "snippet": "OAuth2 implementation with proper error handling. Common issues: token expiration, invalid client credentials.",
-                "type": "documentation",
-                "file_path": "docs/authentication.md"
-            },
-            {
-                "id": "code-auth-002",
-                "score": 0.89,
-                "title": "Authentication Service Class",
-                "snippet": "def handle_oauth_login(self, provider, token): if not token: raise AuthError('Invalid token') ...",
-                "type": "code",
-                "file_path": "src/auth/service.py"
-            },
-            {
-                "id": "issue-auth-003",
-                "score": 0.84,
-                "title": "Similar Issue Resolution",
-                "snippet": "Fixed similar OAuth login failures by updating token validation logic and improving error messages.",
-                "type": "issue",
-                "file_path": "issues/resolved/auth-fix-234.md"
-            },
-            {
-                "id": "test-auth-004",
-                "score": 0.78,
-                "title": "Authentication Test Cases",
-                "snippet": "Test cases covering OAuth flow, token validation, and error scenarios. Includes mock providers setup.",
-                "type": "test",
-                "file_path": "tests/test_authentication.py"
-            }
-        ]
-        
-        # Filter results based on top_k
-        filtered_results = search_results[:top_k]
-        
-        return p.ToolResult(
-            data={
-                "query": query,
-                "total_results": len(search_results),
-                "returned_results": len(filtered_results),
-                "hits": filtered_results,
-                "success": True
-            },
-            control={"lifespan": "response"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Search failed: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    # Simulated semantic search results, already ranked by score
+    filtered_results = copy.deepcopy(_SEARCH_RESULTS[:max(top_k, 0)])
+    
+    return p.ToolResult(
+        data={
+            "query": query,
+            "total_results": len(_SEARCH_RESULTS),
+            "returned_results": len(filtered_results),
+            "hits": filtered_results,
+            "success": True
+        },
+        control=_RESPONSE_CTL
+    )
 
 # Additional development tools
+_ENVIRONMENTS = {
+    "dev": {"status": "healthy", "version": "v2.1.3-dev", "uptime": "99.2%"},
+    "staging": {"status": "healthy", "version": "v2.1.2", "uptime": "98.7%"},
+    "production": {"status": "healthy", "version": "v2.1.1", "uptime": "99.9%"}
+}
+
+def _analyze_pr(pr_id: int) -> dict:
+    # Simulated analysis, built fresh per call like every other tool result
+    return {
+        "pr_id": pr_id,
+        "security_issues": (
+            {"severity": "medium", "description": "Potential SQL injection in user input handling"},
+            {"severity": "low", "description": "Hardcoded API endpoint in configuration"}
+        ),
+        "performance_issues": (
+            {"severity": "high", "description": "N+1 query detected in user data fetching"},
+            {"severity": "medium", "description": "Large payload size in API response"}
+        ),
+        "best_practices": (
+            {"type": "warning", "description": "Missing error handling in async function"},
+            {"type": "suggestion", "description": "Consider using dependency injection pattern"}
+        ),
+        "test_coverage": {
+            "current": "78%",
+            "target": "85%",
+            "missing_coverage": ("error_handler.py", "utils/validation.py")
+        },
+        "overall_score": 7.5
+    }
+
 @p.tool
+@_tool_safe("Code analysis failed")
 async def code_review_analyzer(context: p.ToolContext, pr_id: int) -> p.ToolResult:
     """Analyze code changes in a pull request for potential issues"""
-    try:
-        analysis = {
-            "pr_id": pr_id,
-            "security_issues": [
-                {"severity": "medium", "description": "Potential SQL injection in user input handling"},
-                {"severity": "low", "description": "Hardcoded API endpoint in configuration"}
-            ],
-            "performance_issues": [
-                {"severity": "high", "description": "N+1 query detected in user data fetching"},
-                {"severity": "medium", "description": "Large payload size in API response"}
-            ],
-            "best_practices": [
-                {"type": "warning", "description": "Missing error handling in async function"},
-                {"type": "suggestion", "description": "Consider using dependency injection pattern"}
-            ],
-            "test_coverage": {
-                "current": "78%",
-                "target": "85%",
-                "missing_coverage": ["error_handler.py", "utils/validation.py"]
-            },
-            "overall_score": 7.5
-        }
-        
-        return p.ToolResult(data=analysis, control={"lifespan": "response"})
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Code analysis failed: {str(e)}", "success": False},
-            control={"lifespan": "response"}
-        )
+    return p.ToolResult(data=_analyze_pr(pr_id), control=_RESPONSE_CTL)
 
 @p.tool
+@_tool_safe("Status check failed")
 async def deployment_status_checker(context: p.ToolContext, environment: str) -> p.ToolResult:
     """Check the deployment status of different environments"""
-    try:
-        environments = {
-            "dev": {"status": "healthy", "version": "v2.1.3-dev", "uptime": "99.2%"},
-            "staging": {"status": "healthy", "version": "v2.1.2", "uptime": "98.7%"},
-            "production": {"status": "healthy", "version": "v2.1.1", "uptime": "99.9%"}
-        }
-        
-        env_status = environments.get(environment.lower())
-        if not env_status:
-            return p.ToolResult(
-                data={"error": f"Environment '{environment}' not found", "success": False},
-                control={"lifespan": "response"}
-            )
-        
+    env_status = _ENVIRONMENTS.get(environment.lower())
+    if not env_status:
         return p.ToolResult(
-            data={
-                "environment": environment,
-                **env_status,
-                "last_checked": datetime.now().isoformat(),
-                "success": True
-            },
-            control={"lifespan": "response"}
-        )
-    except Exception as e:
-        return p.ToolResult(
-            data={"error": f"Status check failed: {str(e)}", "success": False},
-            control={"lifespan": "response"}
+            data={"error": f"Environment '{environment}' not found", "success": False},
+            control=_RESPONSE_CTL
         )
+    
+    data = copy.deepcopy(env_status)
+    data["environment"] = environment
+    data["last_checked"] = _now_iso()
+    data["success"] = True
+    return p.ToolResult(data=data, control=_RESPONSE_CTL)
+
+# Journey definitions. Each journey is described as data: its canned responses and
+# its state graph as (state, source state, transition_to kwargs) steps, where a
+# source of None is the journey's initial state.
+_ISSUE_MANAGEMENT_JOURNEY = {
+    "title": "Issue Management",
+    "description": "Guide users through creating, updating, and resolving GitHub issues",
+    "conditions": ("User wants to manage GitHub issues", "User mentions bug reports", "User needs help with issue tracking"),
+    "canned_responses": (
+        "I'll help you manage your GitHub issues. What would you like to do with the issues?",
+        "Let me check the current status of issue #{issue_id} for you.",
+        "I found {{issues_count}} open issues in the {{repo_name}} repository. Would you like me to show you the details?",
+    ),
+    "states": (
+        ("ask_action", None, {"chat_state": "Ask user what they want to do with GitHub issues (create, view, update, close)"}),
+        
+        # Branch for creating issues
+        ("ask_issue_details", "ask_action", {"condition": "User wants to create a new issue", "chat_state": "Ask for the issue title and description"}),
+        ("create_issue", "ask_issue_details", {"tool_state": github_create_issue}),
+        ("confirm_created", "create_issue", {"chat_state": "Confirm the issue has been created successfully and ask if they need anything else"}),
+        
+        # Branch for viewing issues
+        ("list_issues", "ask_action", {"condition": "User wants to view existing issues", "tool_state": github_list_open_issues}),
+        ("show_issues", "list_issues", {"chat_state": "Show the list of open issues and ask if they want details on any specific issue"}),
+        
+        # Branch for closing issues
+        ("ask_issue_id", "ask_action", {"condition": "User wants to close an issue", "chat_state": "Ask for the issue ID to close"}),
+        ("close_issue", "ask_issue_id", {"tool_state": github_close_issue}),
+        ("confirm_closed", "close_issue", {"chat_state": "Confirm the issue has been closed and ask if they need help with anything else"}),
+    ),
+}
+
+_PULL_REQUEST_MANAGEMENT_JOURNEY = {
+    "title": "Pull Request Management",
+    "description": "Help users create, review, and manage pull requests",
+    "conditions": ("User wants to work with pull requests", "User mentions PR", "User wants to merge code"),
+    "canned_responses": (
+        "I can help you with pull request management. What would you like to do?",
+        "Let me fetch the details for pull request #{pr_id}.",
+        "I found {{pr_count}} open pull requests. Here are the details:",
+        "Pull request #{pr_id} has been {{action}} successfully!",
+    ),
+    "states": (
+        ("ask_action", None, {"chat_state": "Ask what they want to do with pull requests (create, view, merge, close)"}),
+        
+        # Create PR branch
+        ("ask_pr_details", "ask_action", {"condition": "User wants to create a pull request", "chat_state": "Ask for PR title, description, source branch, and target branch"}),
+        ("create_pr", "ask_pr_details", {"tool_state": github_create_pull_request}),
+        ("confirm_created", "create_pr", {"chat_state": "Confirm PR creation and provide next steps for review"}),
+        
+        # View PRs branch
+        ("list_prs", "ask_action", {"condition": "User wants to view pull requests", "tool_state": github_list_pull_requests}),
+        ("show_prs", "list_prs", {"chat_state": "Present the list of PRs and offer to show details or perform actions"}),
+        
+        # Merge PR branch
+        ("ask_pr_id", "ask_action", {"condition": "User wants to merge a pull request", "chat_state": "Ask for PR ID and confirm merge action"}),
+        ("merge_pr", "ask_pr_id", {"tool_state": github_merge_pull_request}),
+        ("confirm_merged", "merge_pr", {"chat_state": "Confirm successful merge and suggest next steps"}),
+    ),
+}
+
+_CI_CD_TROUBLESHOOTING_JOURNEY = {
+    "title": "CI/CD Troubleshooting",
+    "description": "Help diagnose and resolve CI/CD pipeline issues",
+    "conditions": ("Tests are failing", "CI pipeline is broken", "User reports build failures", "Deployment issues"),
+    "canned_responses": (
+        "I'll help you troubleshoot the CI/CD issues. Let me start by running the latest tests.",
+        "The test results show {{failed_tests_count}} failing tests. Let me analyze the failures.",
+        "Based on the error analysis, here are the recommended fixes:",
+        "I've found similar issues in our knowledge base. Here are potential solutions:",
+    ),
+    "states": (
+        ("ask_details", None, {"chat_state": "Acknowledge the CI/CD issue and ask for repository and commit details"}),
+        
+        # Run tests
+        ("run_tests", "ask_details", {"tool_state": sandbox_run_tests}),
+        
+        # Analyze results
+        ("tests_passed", "run_tests", {"condition": "Tests pass successfully", "chat_state": "Inform that all tests are passing and suggest checking deployment status"}),
+        ("search_failures", "run_tests", {"condition": "Tests are failing", "tool_state": vector_retriever_search}),
+        
+        # Provide solutions
+        ("present_fixes", "search_failures", {"chat_state": "Present analysis of test failures with suggested fixes and relevant documentation"}),
+        
+        # Check deployment
+        ("check_deployment", "tests_passed", {"tool_state": deployment_status_checker}),
+        ("report_deployment", "check_deployment", {"chat_state": "Report deployment status and provide recommendations"}),
+    ),
+}
+
+_CODE_REVIEW_JOURNEY = {
+    "title": "Code Review Assistance",
+    "description": "Help with code review processes and quality assurance",
+    "conditions": ("User needs code review", "User mentions code quality", "Pull request review needed"),
+    "canned_responses": (
+        "I'll help you with the code review. Which pull request would you like me to analyze?",
+        "Let me analyze the code changes in PR #{pr_id} for potential issues.",
+        "Code analysis complete! I found {{issue_count}} issues to address.",
+        "The code quality score is {{score}}/10. Here are the main areas for improvement:",
+    ),
+    "states": (
+        ("ask_pr_id", None, {"chat_state": "Ask for the pull request ID to review"}),
+        
+        # Get PR details
+        ("get_pr_details", "ask_pr_id", {"tool_state": github_get_pull_request_details}),
+        
+        # Analyze code
+        ("analyze_code", "get_pr_details", {"tool_state": code_review_analyzer}),
+        
+        # Present findings
+        ("present_findings", "analyze_code", {"chat_state": "Present detailed code review findings with actionable recommendations"}),
+    ),
+}
 
 # Journey Creation Functions
-async def create_issue_management_journey(agent: p.Agent) -> p.Journey:
-    """Create a journey for managing GitHub issues"""
+async def _build_journey(agent: p.Agent, spec: dict) -> p.Journey:
+    """Create a journey and replay its spec's canned responses and state graph"""
     journey = await agent.create_journey(
-        title="Issue Management",
-        description="Guide users through creating, updating, and resolving GitHub issues",
-        conditions=["User wants to manage GitHub issues", "User mentions bug reports", "User needs help with issue tracking"]
-    )
-    
-    # Create journey-scoped canned responses
-    await journey.create_canned_response(
-        template="I'll help you manage your GitHub issues. What would you like to do with the issues?"
-    )
-    await journey.create_canned_response(
-        template="Let me check the current status of issue #{issue_id} for you."
-    )
-    await journey.create_canned_response(
-        template="I found {{issues_count}} open issues in the {{repo_name}} repository. Would you like me to show you the details?"
-    )
-    
-    # Journey flow states
-    initial_transition = await journey.initial_state.transition_to(
-        chat_state="Ask user what they want to do with GitHub issues (create, view, update, close)"
-    )
-    
-    # Branch for creating issues
-    create_branch = await initial_transition.target.transition_to(
-        condition="User wants to create a new issue",
-        chat_state="Ask for the issue title and description"
-    )
-    
-    create_issue_state = await create_branch.target.transition_to(
-        tool_state=github_create_issue
-    )
-    
-    await create_issue_state.target.transition_to(
-        chat_state="Confirm the issue has been created successfully and ask if they need anything else"
-    )
-    
-    # Branch for viewing issues
-    view_branch = await initial_transition.target.transition_to(
-        condition="User wants to view existing issues",
-        tool_state=github_list_open_issues
-    )
-    
-    await view_branch.target.transition_to(
-        chat_state="Show the list of open issues and ask if they want details on any specific issue"
-    )
-    
-    # Branch for closing issues
-    close_branch = await initial_transition.target.transition_to(
-        condition="User wants to close an issue",
-        chat_state="Ask for the issue ID to close"
-    )
-    
-    close_issue_state = await close_branch.target.transition_to(
-        tool_state=github_close_issue
+        title=spec["title"],
+        description=spec["description"],
+        conditions=list(spec["conditions"])
     )
     
-    await close_issue_state.target.transition_to(
-        chat_state="Confirm the issue has been closed and ask if they need help with anything else"
-    )
+    # Canned responses and the state graph don't depend on each other
+    async with asyncio.TaskGroup() as tg:
+        for template in spec["canned_responses"]:
+            tg.create_task(journey.create_canned_response(template=template))
+        tg.create_task(_build_journey_states(journey, spec["states"]))
     
     return journey
 
+async def _build_journey_states(journey: p.Journey, steps) -> None:
+    """Create a journey's states wave by wave, sibling transitions concurrently"""
+    states = {None: journey.initial_state}
+    remaining = list(steps)
+    while remaining:
+        ready = [step for step in remaining if step[1] in states]
+        if not ready:
+            raise ValueError(f"Journey steps reference unknown states: {[step[1] for step in remaining]}")
+        remaining = [step for step in remaining if step[1] not in states]
+        
+        # Every step in a wave leaves a state that already exists
+        async with asyncio.TaskGroup() as tg:
+            created = [
+                (name, tg.create_task(states[source].transition_to(**kwargs)))
+                for name, source, kwargs in ready
+            ]
+        for name, task in created:
+            states[name] = task.result().target
+
+async def create_issue_management_journey(agent: p.Agent) -> p.Journey:
+    """Create a journey for managing GitHub issues"""
+    return await _build_journey(agent, _ISSUE_MANAGEMENT_JOURNEY)
+
 async def create_pull_request_management_journey(agent: p.Agent) -> p.Journey:
     """Create a journey for managing pull requests"""
-    journey = await agent.create_journey(
-        title="Pull Request Management",
-        description="Help users create, review, and manage pull requests",
-        conditions=["User wants to work with pull requests", "User mentions PR", "User wants to merge code"]
-    )
-    
-    # Journey-scoped canned responses
-    await journey.create_canned_response(
-        template="I can help you with pull request management. What would you like to do?"
-    )
-    await journey.create_canned_response(
-        template="Let me fetch the details for pull request #{pr_id}."
-    )
-    await journey.create_canned_response(
-        template="I found {{pr_count}} open pull requests. Here are the details:"
-    )
-    await journey.create_canned_response(
-        template="Pull request #{pr_id} has been {{action}} successfully!"
-    )
-    
-    # Journey states
-    initial_state = await journey.initial_state.transition_to(
-        chat_state="Ask what they want to do with pull requests (create, view, merge, close)"
-    )
-    
-    # Create PR branch
-    create_pr_branch = await initial_state.target.transition_to(
-        condition="User wants to create a pull request",
-        chat_state="Ask for PR title, description, source branch, and target branch"
-    )
-    
-    create_pr_state = await create_pr_branch.target.transition_to(
-        tool_state=github_create_pull_request
-    )
-    
-    await create_pr_state.target.transition_to(
-        chat_state="Confirm PR creation and provide next steps for review"
-    )
-    
-    # View PRs branch
-    view_pr_branch = await initial_state.target.transition_to(
-        condition="User wants to view pull requests",
-        tool_state=github_list_pull_requests
-    )
-    
-    await view_pr_branch.target.transition_to(
-        chat_state="Present the list of PRs and offer to show details or perform actions"
-    )
-    
-    # Merge PR branch
-    merge_pr_branch = await initial_state.target.transition_to(
-        condition="User wants to merge a pull request",
-        chat_state="Ask for PR ID and confirm merge action"
-    )
-    
-    merge_pr_state = await merge_pr_branch.target.transition_to(
-        tool_state=github_merge_pull_request
-    )
-    
-    await merge_pr_state.target.transition_to(
-        chat_state="Confirm successful merge and suggest next steps"
-    )
-    
-    return journey
+    return await _build_journey(agent, _PULL_REQUEST_MANAGEMENT_JOURNEY)
 
 async def create_ci_cd_troubleshooting_journey(agent: p.Agent) -> p.Journey:
     """Create a journey for CI/CD troubleshooting"""
-    journey = await agent.create_journey(
-        title="CI/CD Troubleshooting",
-        description="Help diagnose and resolve CI/CD pipeline issues",
-        conditions=["Tests are failing", "CI pipeline is broken", "User reports build failures", "Deployment issues"]
-    )
-    
-    # Journey-scoped canned responses
-    await journey.create_canned_response(
-        template="I'll help you troubleshoot the CI/CD issues. Let me start by running the latest tests."
-    )
-    await journey.create_canned_response(
-        template="The test results show {{failed_tests_count}} failing tests. Let me analyze the failures."
-    )
-    await journey.create_canned_response(
-        template="Based on the error analysis, here are the recommended fixes:"
-    )
-    await journey.create_canned_response(
-        template="I've found similar issues in our knowledge base. Here are potential solutions:"
-    )
-    
-    # Journey states
-    initial_state = await journey.initial_state.transition_to(
-        chat_state="Acknowledge the CI/CD issue and ask for repository and commit details"
-    )
-    
-    # Run tests
-    run_tests_state = await initial_state.target.transition_to(
-        tool_state=sandbox_run_tests
-    )
-    
-    # Analyze results
-    analyze_success = await run_tests_state.target.transition_to(
-        condition="Tests pass successfully",
-        chat_state="Inform that all tests are passing and suggest checking deployment status"
-    )
-    
-    analyze_failure = await run_tests_state.target.transition_to(
-        condition="Tests are failing",
-        tool_state=vector_retriever_search
-    )
-    
-    # Provide solutions
-    await analyze_failure.target.transition_to(
-        chat_state="Present analysis of test failures with suggested fixes and relevant documentation"
-    )
-    
-    # Check deployment
-    deployment_check = await analyze_success.target.transition_to(
-        tool_state=deployment_status_checker
-    )
-    
-    await deployment_check.target.transition_to(
-        chat_state="Report deployment status and provide recommendations"
-    )
-    
-    return journey
+    return await _build_journey(agent, _CI_CD_TROUBLESHOOTING_JOURNEY)
 
 async def create_code_review_journey(agent: p.Agent) -> p.Journey:
     """Create a journey for code review assistance"""
-    journey = await agent.create_journey(
-        title="Code Review Assistance",
-        description="Help with code review processes and quality assurance",
-        conditions=["User needs code review", "User mentions code quality", "Pull request review needed"]
-    )
-    
-    # Journey-scoped canned responses
-    await journey.create_canned_response(
-        template="I'll help you with the code review. Which pull request would you like me to analyze?"
-    )
-    await journey.create_canned_response(
-        template="Let me analyze the code changes in PR #{pr_id} for potential issues."
-    )
-    await journey.create_canned_response(
-        template="Code analysis complete! I found {{issue_count}} issues to address."
-    )
-    await journey.create_canned_response(
-        template="The code quality score is {{score}}/10. Here are the main areas for improvement:"
-    )
-    
-    # Journey states
-    initial_state = await journey.initial_state.transition_to(
-        chat_state="Ask for the pull request ID to review"
-    )
-    
-    # Get PR details
-    get_pr_details = await initial_state.target.transition_to(
-        tool_state=github_get_pull_request_details
-    )
-    
-    # Analyze code
-    analyze_code = await get_pr_details.target.transition_to(
-        tool_state=code_review_analyzer
-    )
-    
-    # Present findings
-    await analyze_code.target.transition_to(
-        chat_state="Present detailed code review findings with actionable recommendations"
-    )
-    
-    return journey
+    return await _build_journey(agent, _CODE_REVIEW_JOURNEY)
 
 # Main application function
 async def main() -> None:
@@ -790,6 +756,7 @@ async def main() -> None:
                 # Core GitHub tools
                 github_list_open_issues,
                 github_get_issue_details,
+                github_get_issues_bulk,
                 github_create_issue,
                 github_close_issue,
                 github_reopen_issue,
@@ -797,6 +764,7 @@ async def main() -> None:
                 # Pull request tools
                 github_list_pull_requests,
                 github_get_pull_request_details,
+                github_get_pull_requests_bulk,
                 github_create_pull_request,
                 github_merge_pull_request,
                 github_close_pull_request,
@@ -813,14 +781,14 @@ async def main() -> None:
             await agent.create_guideline(
                 condition="User wants to list, view, create, close, or reopen GitHub issues",
                 action="Use the appropriate GitHub issue management tools to help the user",
-                tools=[github_list_open_issues, github_get_issue_details, github_create_issue, github_close_issue, github_reopen_issue]
+                tools=[github_list_open_issues, github_get_issue_details, github_get_issues_bulk, github_create_issue, github_close_issue, github_reopen_issue]
             )
             
             # Pull Request Management Tools  
             await agent.create_guideline(
                 condition="User wants to work with pull requests - list, view, create, merge, or close PRs",
                 action="Use the appropriate pull request management tools to assist the user",
-                tools=[github_list_pull_requests, github_get_pull_request_details, github_create_pull_request, github_merge_pull_request, github_close_pull_request]
+                tools=[github_list_pull_requests, github_get_pull_request_details, github_get_pull_requests_bulk, github_create_pull_request, github_merge_pull_request, github_close_pull_request]
             )
             
             # CI/CD and Testing Tools
@@ -830,6 +798,14 @@ async def main() -> None:
                 tools=[sandbox_run_tests, vector_retriever_search, code_review_analyzer, deployment_status_checker]
             )
             
+            # Journeys are independent of each other, so build them concurrently
+            await asyncio.gather(
+                create_issue_management_journey(agent),
+                create_pull_request_management_journey(agent),
+                create_ci_cd_troubleshooting_journey(agent),
+                create_code_review_journey(agent),
+            )
+            
             # Create comprehensive canned responses for various scenarios
             
             # Greeting and general responses
@@ -980,4 +956,4 @@ async def main() -> None:
         traceback.print_exc()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None)
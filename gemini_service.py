@@ -4,86 +4,532 @@ Simplified implementation that actually works
 """
 
 import os
+import re
 import json
 import time
 import asyncio
+import atexit
+import random
+import hashlib
+import warnings
+import sqlite3
+import functools
+import dataclasses
+import contextlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Generic, Mapping, TypeVar
 from dotenv import load_dotenv
 import google.api_core.exceptions
+from pydantic import ValidationError
 
-# Load environment variables
+# Load environment variables once at import; the API key is resolved here too,
+# so constructing generators and embedders never touches .env or os.environ
 load_dotenv()
+_API_KEY = os.environ.get("GEMINI_API_KEY")
+
+# Model used when GEMINI_MODEL isn't set, and the configured model, resolved once
+GEMINI_MODEL_DEFAULT = "gemini-2.0-flash"
+_MODEL_NAME = os.environ.get("GEMINI_MODEL", GEMINI_MODEL_DEFAULT)
 
 # Import required modules
+import numpy as np
 import google.generativeai as genai
 import parlant.sdk as p
+from parlant.core.engines.alpha.prompt_builder import BuiltInSection
 from parlant.core.nlp.generation_info import GenerationInfo, UsageInfo
 
+# Optional faster JSON codec; the stdlib is used when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional local tokenizer for exact token counts; the character estimate is
+# used when it isn't installed
+try:
+    import sentencepiece
+except ImportError:
+    sentencepiece = None
+
 T = TypeVar('T')
 
+# Outermost {...} span in a reply that wraps its JSON in prose
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+# Comma left directly before a closing bracket
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_CLOSERS = {"{": "}", "[": "]"}
+
+def _repair_json(text: str):
+    """Parse a reply cut off mid-object by closing its open strings and brackets.
+    
+    Returns None when there is no object to recover or the repair doesn't parse.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    
+    stack = []
+    in_string = escaped = False
+    end = len(text)
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]":
+            if not stack or stack.pop() != ch:
+                return None
+            if not stack:
+                end = i + 1
+                break
+    
+    repaired = text[start:end]
+    if in_string:
+        repaired += '"'
+    repaired = repaired.rstrip().removesuffix(",")
+    if repaired.endswith(":"):
+        repaired += "null"
+    repaired = _TRAILING_COMMA_RE.sub(r"\1", repaired + "".join(reversed(stack)))
+    try:
+        return _loads(repaired)
+    except json.JSONDecodeError:
+        return None
+
+def _canonical_json(payload: Any) -> bytes:
+    """Serialize with sorted keys so equal payloads always produce equal bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS, default=str)
+    return json.dumps(payload, sort_keys=True, default=str).encode()
+
+def _dumps(payload: Any) -> str:
+    """Serialize as compact JSON text."""
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload, separators=(",", ":"))
+
+def _loads(text: str) -> Any:
+    """Parse JSON; orjson's decode error subclasses json.JSONDecodeError."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
 class RateLimiter:
     """Simple rate limiter for API calls."""
     
     def __init__(self, calls_per_minute: int = 10, calls_per_day: int = 50):
         self.calls_per_minute = calls_per_minute
         self.calls_per_day = calls_per_day
-        self.minute_calls = []
-        self.day_calls = []
+        # Per-minute limit is a token bucket refilled continuously, so bursts
+        # are spread out instead of draining the window and stalling for a minute
+        self.tokens = float(calls_per_minute)
+        self.refill_rate = calls_per_minute / 60.0
+        self.last_refill = time.monotonic()
+        # Admission times within the last day, in a fixed ring of packed doubles:
+        # the oldest live entry sits day_count slots behind day_head
+        self.day_calls = array('d', [0.0]) * calls_per_day
+        self.day_head = 0
+        self.day_count = 0
         self.lock = asyncio.Lock()
         self.daily_quota_exhausted = False
+        # Monotonic time at which an exhausted daily quota has room again
+        self.exhausted_until = 0.0
     
-    async def wait_if_needed(self):
-        """Wait if rate limit would be exceeded."""
+    def _refill(self, now: float):
+        """Add the tokens earned since the last refill, up to the bucket size."""
+        elapsed = now - self.last_refill
+        self.tokens = min(float(self.calls_per_minute), self.tokens + elapsed * self.refill_rate)
+        self.last_refill = now
+    
+    def _try_acquire(self, now: float):
+        """Take a slot if one is free; return None on success, else seconds until the next token."""
         if self.daily_quota_exhausted:
-            raise google.api_core.exceptions.ResourceExhausted(
-                "Daily quota already exhausted. Service is temporarily unavailable."
-            )
-            
-        async with self.lock:
-            now = time.time()
-            
-            # Clean old entries
-            self.minute_calls = [call_time for call_time in self.minute_calls if now - call_time < 60]
-            self.day_calls = [call_time for call_time in self.day_calls if now - call_time < 86400]
-            
-            # Check limits
-            if len(self.minute_calls) >= self.calls_per_minute:
-                wait_time = 60 - (now - self.minute_calls[0])
-                if wait_time > 0:
-                    await asyncio.sleep(wait_time)
-                    return await self.wait_if_needed()
-            
-            if len(self.day_calls) >= self.calls_per_day:
+            if now < self.exhausted_until:
+                raise google.api_core.exceptions.ResourceExhausted(
+                    "Daily quota already exhausted. Service is temporarily unavailable."
+                )
+            self.daily_quota_exhausted = False
+        
+        self._refill(now)
+        
+        # Clean old entries; admissions are appended in time order
+        while self.day_count and now - self.day_calls[self.day_head - self.day_count] >= 86400:
+            self.day_count -= 1
+        
+        # Check limits
+        if self.tokens >= 1:
+            if self.day_count >= self.calls_per_day:
+                # Room again once the oldest admission in the window ages out
                 self.daily_quota_exhausted = True
+                self.exhausted_until = self.day_calls[self.day_head - self.day_count] + 86400
                 raise google.api_core.exceptions.ResourceExhausted(
                     "Daily quota exceeded. Please try again tomorrow."
                 )
             
             # Record this call
-            self.minute_calls.append(now)
-            self.day_calls.append(now)
+            self.tokens -= 1
+            self.day_calls[self.day_head] = now
+            self.day_head = (self.day_head + 1) % self.calls_per_day
+            self.day_count += 1
+            return None
+        
+        # Only until the next token is earned
+        return (1 - self.tokens) / self.refill_rate
+    
+    async def wait_if_needed(self):
+        """Wait if rate limit would be exceeded."""
+        # Fast path: with nobody holding the lock there is no queue to respect,
+        # and _try_acquire never awaits, so it can't interleave with another caller
+        if not self.lock.locked():
+            wait_time = self._try_acquire(time.monotonic())
+            if wait_time is None:
+                return
+        
+        while True:
+            # Checked under the lock on every pass, so callers that were
+            # sleeping see an exhaustion recorded while they waited
+            async with self.lock:
+                wait_time = self._try_acquire(time.monotonic())
+                if wait_time is None:
+                    return
+            
+            # Sleep without holding the lock, then re-check
+            await asyncio.sleep(wait_time)
     
     def mark_quota_exhausted(self):
-        """Mark daily quota as exhausted."""
+        """Mark daily quota as exhausted for the next day, as reported by the server."""
         self.daily_quota_exhausted = True
+        self.exhausted_until = time.monotonic() + 86400
 
 # Global rate limiter instance
 _global_rate_limiter = RateLimiter()
 
+# Set once genai.configure() has run for this process
+_genai_configured = False
+
+def _configure_genai() -> None:
+    """Configure the Gemini SDK once per process.
+    
+    genai.configure() discards the SDK's cached service clients, so calling it per
+    generator/embedder would throw away their pooled connections every time.
+    """
+    global _genai_configured
+    if not _genai_configured:
+        genai.configure(api_key=_API_KEY)
+        _genai_configured = True
+
+@functools.lru_cache(maxsize=8)
+def _get_model(model_name: str):
+    """GenerativeModel for a model name, shared by every generator using it."""
+    _configure_genai()
+    return genai.GenerativeModel(model_name)
+
+def _estimate_tokens(text: str) -> int:
+    """Character-based token estimate (~4 characters per token); no tokenizer pass needed."""
+    return len(text) >> 2
+
+def _load_sentencepiece():
+    """SentencePiece model named by GEMINI_TOKENIZER_MODEL, or None to use the estimate."""
+    model_path = os.environ.get("GEMINI_TOKENIZER_MODEL")
+    if sentencepiece is None or not model_path:
+        return None
+    return sentencepiece.SentencePieceProcessor(model_file=model_path)
+
+_sp_model = _load_sentencepiece()
+
+# Texts shorter than this are counted exactly and memoized; glossary terms and
+# tool descriptions repeat, full prompts rarely do and would bloat the LRU
+_TOKEN_CACHE_MAX_CHARS = 2048
+# Characters encoded from each of the start, middle and end of a long text
+_TOKEN_SAMPLE_CHARS = 4096
+
+@functools.lru_cache(maxsize=4096)
+def _count_short(text: str) -> int:
+    return len(_sp_model.encode(text))
+
+def _count_tokens(text: str) -> int:
+    """Token count from the local tokenizer: exact up to a few samples' worth, extrapolated beyond."""
+    if len(text) < _TOKEN_CACHE_MAX_CHARS:
+        return _count_short(text)
+    if len(text) <= 3 * _TOKEN_SAMPLE_CHARS:
+        return len(_sp_model.encode(text))
+    
+    # Tokens per character measured on three spread-out windows, applied to the whole text
+    middle = (len(text) - _TOKEN_SAMPLE_CHARS) // 2
+    sample = (
+        text[:_TOKEN_SAMPLE_CHARS]
+        + text[middle:middle + _TOKEN_SAMPLE_CHARS]
+        + text[-_TOKEN_SAMPLE_CHARS:]
+    )
+    return round(len(text) * len(_sp_model.encode(sample)) / len(sample))
+
+class GeminiTokenizer(p.EstimatingTokenizer):
+    """Token counts for Gemini models.
+    
+    Uses a local SentencePiece vocabulary (e.g. the Gemma tokenizer.model) when
+    GEMINI_TOKENIZER_MODEL points at one, otherwise ~4 characters per token.
+    """
+    
+    async def estimate_token_count(self, prompt: str) -> int:
+        if _sp_model is not None:
+            return _count_tokens(prompt)
+        return _estimate_tokens(prompt)
+
+# Shared by every generator and embedder; the estimate is stateless
+_tokenizer = GeminiTokenizer()
+
+# Rate limiting, server-side failures and timeouts that are worth retrying
+_RETRYABLE_ERRORS = (
+    google.api_core.exceptions.ResourceExhausted,
+    google.api_core.exceptions.ServiceUnavailable,
+    google.api_core.exceptions.InternalServerError,
+    google.api_core.exceptions.DeadlineExceeded,
+)
+
+# Generation also retries replies that fail to parse or validate (pydantic's
+# ValidationError is a ValueError); sampling again usually yields a usable one
+_GENERATION_RETRYABLE_ERRORS = _RETRYABLE_ERRORS + (ValueError,)
+
+def _backoff_delay(attempt: int, base_delay: float = 1.0) -> float:
+    """Exponential backoff with jitter, so concurrent retries don't hit the API in lockstep."""
+    return base_delay * (2 ** attempt) + random.uniform(0, 0.5)
+
+def _retry_delay(error, attempt: int, base_delay: float = 1.0) -> float:
+    """Wait before retrying: the server's RetryInfo delay when the error carries one, else backoff."""
+    for detail in getattr(error, "details", None) or ():
+        server_delay = getattr(detail, "retry_delay", None)
+        if server_delay is not None:
+            # Jittered so callers told the same delay don't all return at once
+            return (server_delay.seconds + server_delay.nanos / 1e9) * random.uniform(0.8, 1.2)
+    return _backoff_delay(attempt, base_delay)
+
+def _is_daily_quota_error(error) -> bool:
+    """Whether an error means the daily quota is spent, so retrying today is pointless.
+    
+    Decided from the QuotaFailure detail the API attaches to a 429, whose
+    violated quota ids name their window (e.g. "...PerDayPerProjectPerModel");
+    a per-minute 429 is retried after its RetryInfo delay instead.
+    """
+    if _global_rate_limiter.daily_quota_exhausted:
+        return True
+    if not isinstance(error, google.api_core.exceptions.ResourceExhausted):
+        return False
+    for detail in getattr(error, "details", None) or ():
+        for violation in getattr(detail, "violations", ()):
+            quota_id = getattr(violation, "quota_id", "") or ""
+            if "perday" in quota_id.lower():
+                return True
+    return False
+
+async def _call_with_retry(
+    fn, *args, max_retries: int = 3, base_delay: float = 1.0, semaphore=None, logger=None,
+    retryable: tuple = _RETRYABLE_ERRORS, **kwargs
+):
+    """Await an async SDK call under the rate limiter, retrying the errors in retryable."""
+    for attempt in range(max_retries):
+        try:
+            async with semaphore or contextlib.nullcontext():
+                # Wait for rate limiter
+                await _global_rate_limiter.wait_if_needed()
+                return await fn(*args, **kwargs)
+        except retryable as e:
+            # Daily quota won't recover by waiting; let the caller fall back
+            if _is_daily_quota_error(e):
+                _global_rate_limiter.mark_quota_exhausted()
+                raise
+            if attempt == max_retries - 1:
+                raise
+            retry_delay = _retry_delay(e, attempt, base_delay)
+            if logger:
+                logger.warning(f"Gemini request failed, retrying in {retry_delay:.2f}s: {e}")
+            # Back off without holding a concurrency slot
+            await asyncio.sleep(retry_delay)
+
+# Embedding requests: texts per API call and concurrent calls in flight
+_EMBED_BATCH_SIZE = 100
+_embed_semaphore = asyncio.Semaphore(16)
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    """Read a positive integer setting, warning and using the default when it's malformed."""
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        warnings.warn(f"Ignoring {name}={raw!r}: not an integer, using {default}")
+        return default
+    if value < minimum:
+        warnings.warn(f"{name}={value} is below {minimum}, using {minimum}")
+        return minimum
+    return value
+
+# Generation requests in flight at once; concurrent callers (e.g. glossary setup
+# or parallel guideline evaluation) queue here instead of piling into 429 retries
+_generate_semaphore = asyncio.Semaphore(_env_int("GEMINI_MAX_CONCURRENCY", 8))
+
+class EmbeddingCache:
+    """LRU cache of float32 embedding vectors keyed by a digest of the embedded text."""
+    
+    def __init__(self, max_entries: int = 10_000):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+    
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+    
+    def get(self, text: str):
+        key = self._key(text)
+        vector = self._entries.get(key)
+        if vector is not None:
+            self._entries.move_to_end(key)
+        return vector
+    
+    def put(self, text: str, vector) -> None:
+        key = self._key(text)
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+_embedding_cache = EmbeddingCache()
+
+@functools.lru_cache(maxsize=None)
+def _schema_for(schema_type) -> dict:
+    """JSON schema of a response model, derived once per class. Treat as read-only."""
+    return schema_type.model_json_schema()
+
+# Sample values shown to the model per JSON schema type, shared by every scaffold
+# (treat as read-only); optional array/object fields are left out
+_REQUIRED_SAMPLES = {"string": "sample_value", "integer": 1, "number": 0.5, "boolean": True, "array": [], "object": {}}
+_OPTIONAL_SAMPLES = {"string": "optional_value", "integer": 0, "number": 0.0, "boolean": False}
+
+# Characters of sample JSON a prompt scaffold may carry before it is trimmed
+_SCAFFOLD_BUDGET = 2048
+
+def _sample_instance(properties: dict, required_fields: set, use_examples: bool = True) -> dict:
+    """Synthesize a sample instance from the schema's fields, in one pass.
+    
+    Declared field examples are used as-is when use_examples is set; optional
+    array/object fields are left out.
+    """
+    sample = {}
+    for field_name, field_info in properties.items():
+        field_type = field_info.get("type", "string")
+        examples = field_info.get("examples")
+        
+        if use_examples and isinstance(examples, list) and examples:
+            sample[field_name] = examples[0]
+        elif field_name in required_fields:
+            sample[field_name] = _REQUIRED_SAMPLES.get(field_type, "default_value")
+        elif field_type in _OPTIONAL_SAMPLES:
+            sample[field_name] = _OPTIONAL_SAMPLES[field_type]
+    return sample
+
+def _validates(schema_type, instance) -> bool:
+    try:
+        schema_type.model_validate(instance)
+    except Exception:
+        return False
+    return True
+
+@functools.lru_cache(maxsize=256)
+def _schema_scaffold(schema_type) -> tuple[dict, str]:
+    """Sample instance of a response model and the prompt instructions built from it, once per class."""
+    schema_info = _schema_for(schema_type)
+    required_fields = set(schema_info.get("required", ()))
+    properties = schema_info.get("properties", {})
+    
+    # A model-level example declared on the schema beats a synthesized one, as
+    # long as it still validates
+    declared = schema_info.get("examples") or [schema_info.get("example")]
+    if (
+        isinstance(declared, list)
+        and declared
+        and isinstance(declared[0], dict)
+        and _validates(schema_type, declared[0])
+    ):
+        dummy_instance = declared[0]
+    else:
+        dummy_instance = _sample_instance(properties, required_fields)
+        # Field examples are free-form; drop them if they make the sample invalid
+        if not _validates(schema_type, dummy_instance):
+            dummy_instance = _sample_instance(properties, required_fields, use_examples=False)
+    
+    # Large schemas would otherwise add their whole sample to every prompt's
+    # input tokens; show only the required fields, then only their names
+    sample_json = _dumps(dummy_instance)
+    if len(sample_json) > _SCAFFOLD_BUDGET:
+        sample_json = _dumps({k: v for k, v in dummy_instance.items() if k in required_fields})
+    if len(sample_json) > _SCAFFOLD_BUDGET:
+        sample_json = "a JSON object with the fields: " + ", ".join(k for k in properties if k in required_fields)
+    
+    schema_instructions = f"""
+Please respond with valid JSON that matches this schema structure:
+{sample_json}
+
+IMPORTANT: 
+- Return ONLY valid JSON
+- No markdown formatting
+- No code blocks
+- Include all required fields
+"""
+    return dummy_instance, schema_instructions
+
+# Fallback value per JSON schema type; factories so callers never share a list or dict
+_TYPE_DEFAULTS = {
+    "array": list,
+    "boolean": lambda: False,
+    "integer": lambda: 0,
+    "number": lambda: 0.0,
+    "object": dict,
+    "string": lambda: "unavailable",
+}
+
+# Usage reported by fallback responses; UsageInfo is frozen, so one instance is shared
+_NO_USAGE = UsageInfo(input_tokens=0, output_tokens=0)
+
 class SimpleGeminiGenerator(p.SchematicGenerator[T], Generic[T]):
     """Simple working Gemini generator."""
 
-    def __init__(self, model_name: str = "gemini-2.0-flash", logger: p.Logger = None):
+    def __init__(self, model_name: str = GEMINI_MODEL_DEFAULT, logger: p.Logger = None):
         self._model_name = model_name
         self._logger = logger
         
         # Configure Gemini
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
+        if not _API_KEY:
             raise ValueError("GEMINI_API_KEY required")
         
-        genai.configure(api_key=api_key)
-        self._model = genai.GenerativeModel(model_name)
+        self._model = _get_model(model_name)
+        # Fallback result, built on first use
+        self._fallback = None
+    
+    @functools.cached_property
+    def _schema_prompt(self) -> tuple[str, str]:
+        """Schema name and prompt instructions for this generator's response model."""
+        _, schema_instructions = _schema_scaffold(self.schema)
+        return self.schema.__name__, schema_instructions
+    
+    @functools.cached_property
+    def _fallback_defaults(self) -> dict:
+        """Schema-derived default for every field of the response model, built on first fallback."""
+        # Required and optional fields get the same default, so one pass suffices
+        properties = _schema_for(self.schema).get("properties", {})
+        return {
+            field_name: self._get_field_default_value(field_info, field_name)
+            for field_name, field_info in properties.items()
+        }
     
     async def generate(
         self,
@@ -100,94 +546,37 @@ class SimpleGeminiGenerator(p.SchematicGenerator[T], Generic[T]):
         max_retries: int = 3,
         base_delay: float = 1.0
     ) -> p.SchematicGenerationResult[T]:
-        """Generate with exponential backoff retry logic."""
-        last_exception = None
-        
-        for attempt in range(max_retries):
-            try:
-                # Wait for rate limiter
-                await _global_rate_limiter.wait_if_needed()
-                
-                # Attempt generation
-                return await self._generate_once(prompt, hints)
-                
-            except google.api_core.exceptions.ResourceExhausted as e:
-                last_exception = e
-                error_str = str(e).lower()
-                
-                # Mark quota as exhausted in rate limiter
-                if "quota" in error_str and "day" in error_str:
-                    _global_rate_limiter.mark_quota_exhausted()
-                
-                if "quota" in error_str:
-                    # Parse retry delay from error if available
-                    retry_delay = base_delay * (2 ** attempt)  # exponential backoff
-                    
-                    # Check if this is a daily quota issue
-                    if "day" in error_str:
-                        # Daily quota exhausted - don't retry
-                        if self._logger:
-                            self._logger.error(f"Daily quota exhausted: {e}")
-                        # Return a dummy response instead of failing
-                        return await self._create_fallback_response(prompt, hints)
-                    
-                    if attempt < max_retries - 1:  # Don't wait on last attempt
-                        if self._logger:
-                            self._logger.warning(f"Rate limited, waiting {retry_delay}s before retry {attempt + 1}")
-                        await asyncio.sleep(retry_delay)
-                        continue
-                        
-                # Re-raise if not quota related or last attempt
-                if self._logger:
-                    self._logger.error(f"API error: {e}")
-                # Return fallback response instead of raising
-                return await self._create_fallback_response(prompt, hints)
-                
-            except Exception as e:
-                last_exception = e
-                if attempt < max_retries - 1:
-                    # Wait before retrying other errors too
-                    retry_delay = base_delay * (2 ** attempt)
-                    if self._logger:
-                        self._logger.warning(f"Generation failed, retrying in {retry_delay}s: {e}")
-                    await asyncio.sleep(retry_delay)
-                    continue
-                # On final attempt, return fallback instead of raising
-                if self._logger:
-                    self._logger.error(f"Final attempt failed: {e}")
-                return await self._create_fallback_response(prompt, hints)
+        """Generate with exponential backoff retry logic, falling back when it fails."""
+        try:
+            return await _call_with_retry(
+                self._generate_once,
+                prompt,
+                hints,
+                max_retries=max_retries,
+                base_delay=base_delay,
+                semaphore=_generate_semaphore,
+                logger=self._logger,
+                retryable=_GENERATION_RETRYABLE_ERRORS,
+            )
+        except google.api_core.exceptions.ResourceExhausted as e:
+            if self._logger:
+                if _is_daily_quota_error(e):
+                    self._logger.error(f"Daily quota exhausted: {e}")
+                else:
+                    self._logger.error(f"Rate limited after {max_retries} attempts: {e}")
+        except Exception as e:
+            if self._logger:
+                self._logger.error(f"Generation failed: {e}")
         
-        # If we get here, all retries failed
-        if self._logger:
-            self._logger.error(f"All {max_retries} generation attempts failed")
-        # Return fallback response instead of raising
+        # Return a fallback response instead of raising
         return await self._create_fallback_response(prompt, hints)
     
     def _get_field_default_value(self, field_info, field_name="unknown"):
         """Get appropriate default value for a field based on its schema"""
-        field_type = field_info.get("type")
-        
-        # Handle array/sequence types
-        if field_type == "array":
-            return []
-        
-        # Handle boolean types
-        if field_type == "boolean":
-            return False
-            
-        # Handle numeric types
-        if field_type == "integer":
-            return 0
-        elif field_type == "number":
-            return 0.0
-            
-        # Handle object types
-        if field_type == "object":
-            return {}
-            
-        # Handle string types
-        if field_type == "string":
-            return "unavailable"
+        # Handle primitive, array and object types
+        default = _TYPE_DEFAULTS.get(field_info.get("type"))
+        if default is not None:
+            return default()
             
         # Handle union types (anyOf)
         if "anyOf" in field_info:
@@ -220,41 +609,33 @@ class SimpleGeminiGenerator(p.SchematicGenerator[T], Generic[T]):
         """Create a fallback response when API is unavailable."""
         if self._logger:
             self._logger.info("Creating fallback response due to API unavailability")
-            
+        
+        # The fallback never depends on the prompt, so it is validated once and
+        # handed out as deep copies for the rest of an outage, so a caller that
+        # mutates a list or dict field never changes the ones handed out later
+        if self._fallback is None:
+            self._fallback = self._build_fallback_response()
+        return p.SchematicGenerationResult(
+            content=self._fallback.content.model_copy(deep=True),
+            info=self._fallback.info
+        )
+    
+    def _build_fallback_response(self) -> p.SchematicGenerationResult[T]:
+        """Build the fallback result from schema defaults, or from model defaults if that fails."""
         # Get schema type
         schema_type = self.schema
         
         try:
-            # Get schema information without creating an instance
-            schema_info = schema_type.model_json_schema()
-            required_fields = schema_info.get("required", [])
-            properties = schema_info.get("properties", {})
-            
-            # Create a fallback instance based on schema structure
-            fallback_instance = {}
-            for field_name in required_fields:
-                field_info = properties.get(field_name, {})
-                fallback_instance[field_name] = self._get_field_default_value(field_info, field_name)
-            
-            # Add optional fields if they exist
-            for field_name, field_info in properties.items():
-                if field_name not in fallback_instance:
-                    fallback_instance[field_name] = self._get_field_default_value(field_info, field_name)
-            
-            # Create Pydantic instance
-            content = schema_type.model_validate(fallback_instance)
+            # Create Pydantic instance from the cached defaults; validation copies
+            # them, so the shared dict is never handed out
+            content = schema_type.model_validate(self._fallback_defaults)
             
             # Create result
-            usage_info = UsageInfo(
-                input_tokens=0,
-                output_tokens=0,
-            )
-            
             generation_info = GenerationInfo(
                 schema_name=schema_type.__name__,
                 model=f"{self._model_name}_fallback",
                 duration=0.0,
-                usage=usage_info
+                usage=_NO_USAGE
             )
             
             return p.SchematicGenerationResult(
@@ -292,12 +673,11 @@ class SimpleGeminiGenerator(p.SchematicGenerator[T], Generic[T]):
                 
                 content = schema_type.model_validate(defaults)
                 
-                usage_info = UsageInfo(input_tokens=0, output_tokens=0)
                 generation_info = GenerationInfo(
                     schema_name=schema_type.__name__,
                     model=f"{self._model_name}_fallback",
                     duration=0.0,
-                    usage=usage_info
+                    usage=_NO_USAGE
                 )
                 
                 return p.SchematicGenerationResult(
@@ -316,7 +696,7 @@ class SimpleGeminiGenerator(p.SchematicGenerator[T], Generic[T]):
         hints: Mapping[str, Any] = {},
     ) -> p.SchematicGenerationResult[T]:
         """Single generation attempt without retry logic."""
-        start_time = time.time()
+        start_time = time.monotonic()
         
         # Convert prompt to string
         if isinstance(prompt, p.PromptBuilder):
@@ -328,102 +708,75 @@ class SimpleGeminiGenerator(p.SchematicGenerator[T], Generic[T]):
         schema_type = self.schema
         
         try:
-            # Get schema information without creating an instance
-            schema_info = schema_type.model_json_schema()
-            required_fields = schema_info.get("required", [])
-            properties = schema_info.get("properties", {})
+            # Schema instructions are fixed per response model
+            schema_name, schema_instructions = self._schema_prompt
             
-            # Create a sample instance based on schema structure
-            dummy_instance = {}
-            for field_name in required_fields:
-                field_info = properties.get(field_name, {})
-                field_type = field_info.get("type", "string")
-                
-                if field_type == "string":
-                    dummy_instance[field_name] = "sample_value"
-                elif field_type == "integer":
-                    dummy_instance[field_name] = 1
-                elif field_type == "number":
-                    dummy_instance[field_name] = 0.5
-                elif field_type == "boolean":
-                    dummy_instance[field_name] = True
-                elif field_type == "array":
-                    dummy_instance[field_name] = []
-                elif field_type == "object":
-                    dummy_instance[field_name] = {}
-                else:
-                    dummy_instance[field_name] = "default_value"
-            
-            # Add optional fields if they exist
-            for field_name, field_info in properties.items():
-                if field_name not in dummy_instance:
-                    field_type = field_info.get("type", "string")
-                    if field_type == "string":
-                        dummy_instance[field_name] = "optional_value"
-                    elif field_type == "integer":
-                        dummy_instance[field_name] = 0
-                    elif field_type == "number":
-                        dummy_instance[field_name] = 0.0
-                    elif field_type == "boolean":
-                        dummy_instance[field_name] = False
-            
-            # Enhanced prompt for better JSON generation
-            enhanced_prompt = f"""
-{prompt_text}
-
-Please respond with valid JSON that matches this schema structure:
-{json.dumps(dummy_instance, indent=2)}
-
-IMPORTANT: 
-- Return ONLY valid JSON
-- No markdown formatting
-- No code blocks
-- Include all required fields
-"""
+            # Input estimate from the pieces' lengths (plus the two joining newlines),
+            # so the enhanced prompt isn't kept alive across the round-trip
+            input_token_estimate = (len(prompt_text) + len(schema_instructions) + 2) >> 2
             
-            # Generate with Gemini
-            response = self._model.generate_content(
-                enhanced_prompt,
+            # Async SDK call, so other generations and embeddings interleave with the round-trip;
+            # the enhanced prompt is built in place for better JSON generation
+            response = await self._model.generate_content_async(
+                f"\n{prompt_text}\n{schema_instructions}",
                 generation_config=genai.GenerationConfig(
                     temperature=hints.get("temperature", 0.1),
                     max_output_tokens=2048,
+                    # JSON mode: the reply is a bare JSON document, no prose or fences
+                    response_mime_type="application/json",
                 )
             )
             
             response_text = response.text.strip()
             
             # Clean up response
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
+            response_text = response_text.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
             
-            # Parse JSON
+            # Fast path: parse and validate in a single pass. JSON mode makes a clean
+            # reply the common case; anything else takes the salvage path below
             try:
-                parsed_data = json.loads(response_text)
-            except json.JSONDecodeError:
-                # Fallback to dummy data if parsing fails
-                if isinstance(dummy_instance, dict):
-                    parsed_data = dummy_instance
-                else:
-                    parsed_data = {"message": response_text}
-            
-            # Create Pydantic instance
-            content = schema_type.model_validate(parsed_data)
+                content = schema_type.model_validate_json(response_text)
+            except ValidationError:
+                # Parse JSON, salvaging an object embedded in surrounding text or cut
+                # off by the token limit before giving up
+                try:
+                    parsed_data = _loads(response_text)
+                except json.JSONDecodeError:
+                    parsed_data = None
+                    match = _JSON_OBJECT_RE.search(response_text)
+                    if match:
+                        try:
+                            parsed_data = _loads(match.group(0))
+                        except json.JSONDecodeError:
+                            pass
+                    if parsed_data is None:
+                        parsed_data = _repair_json(response_text)
+                    if parsed_data is None:
+                        # Nothing to salvage; fail the attempt so the reply is never
+                        # served (or cached) under the real model name
+                        raise ValueError(f"Unparseable reply: {response_text[:200]!r}")
+                
+                # Create Pydantic instance
+                content = schema_type.model_validate(parsed_data)
             
             # Create result
-            duration = time.time() - start_time
+            duration = time.monotonic() - start_time
             
-            usage_info = UsageInfo(
-                input_tokens=len(enhanced_prompt) // 4,  # Rough estimate
-                output_tokens=len(response_text) // 4,
-            )
+            # Prefer the counts Gemini reports; estimate only when they're missing
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None and usage.prompt_token_count:
+                usage_info = UsageInfo(
+                    input_tokens=usage.prompt_token_count,
+                    output_tokens=usage.candidates_token_count or 0,
+                )
+            else:
+                usage_info = UsageInfo(
+                    input_tokens=input_token_estimate,  # Rough estimate
+                    output_tokens=_estimate_tokens(response_text),
+                )
             
             generation_info = GenerationInfo(
-                schema_name=schema_type.__name__,
+                schema_name=schema_name,
                 model=self._model_name,
                 duration=duration,
                 usage=usage_info
@@ -448,43 +801,98 @@ IMPORTANT:
         return 1000000  # 1M for Gemini 1.5
     
     @property
-    def tokenizer(self):
-        # Simple tokenizer mock
-        class SimpleTokenizer:
-            async def estimate_token_count(self, text: str) -> int:
-                return len(text) // 4
-        return SimpleTokenizer()
+    def tokenizer(self) -> GeminiTokenizer:
+        return _tokenizer
 
 class SimpleGeminiEmbedder(p.Embedder):
     """Simple Gemini embedder."""
     
     def __init__(self, logger: p.Logger = None):
         self._logger = logger
-        genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+        _configure_genai()
     
-    async def embed(self, texts: list[str], hints: Mapping[str, Any] = {}) -> p.EmbeddingResult:
+    async def _embed_content(self, content):
+        """Make one embed_content call under the concurrency cap and rate limiter, retrying transient errors."""
+        result = await _call_with_retry(
+            genai.embed_content_async,
+            model="models/text-embedding-004",
+            content=content,
+            task_type="retrieval_document",
+            semaphore=_embed_semaphore,
+            logger=self._logger
+        )
+        return result['embedding']
+    
+    async def _embed_one_batch(self, texts: list[str]) -> list[list[float]]:
+        """Embed up to one request's worth of texts in a single API call."""
+        try:
+            return await self._embed_content(texts)
+        except (TypeError, ValueError):
+            # SDK versions without list input reject the batch client-side;
+            # fan out one call per text instead, keeping each text's error in
+            # its slot so one failure doesn't discard the others' vectors
+            return await asyncio.gather(
+                *[self._embed_content(text) for text in texts], return_exceptions=True
+            )
+    
+    async def embed_batch(self, texts: list[str]) -> np.ndarray:
+        """Embed texts into a float32 (len(texts), dimensions) array, letting API errors propagate."""
+        vectors = np.empty((len(texts), self.dimensions), dtype=np.float32)
+        missing = {}
+        for index, text in enumerate(texts):
+            cached = _embedding_cache.get(text)
+            if cached is None:
+                missing.setdefault(text, []).append(index)
+            else:
+                vectors[index] = cached
+        if not missing:
+            return vectors
+        
+        # Only texts not seen before go to the API, each distinct text once,
+        # longest first so sub-batches carry similar payload sizes
+        pending = sorted(missing, key=len, reverse=True)
+        chunks = [pending[i:i + _EMBED_BATCH_SIZE] for i in range(0, len(pending), _EMBED_BATCH_SIZE)]
+        
+        results = await asyncio.gather(*[self._embed_one_batch(chunk) for chunk in chunks])
+        
+        # Fill rows in the caller's order, caching a compact copy of each new vector
+        failure = None
+        for chunk, chunk_vectors in zip(chunks, results):
+            for text, vector in zip(chunk, chunk_vectors):
+                if isinstance(vector, BaseException):
+                    failure = vector
+                    continue
+                vector = np.asarray(vector, dtype=np.float32)
+                _embedding_cache.put(text, vector)
+                vectors[missing[text]] = vector
+        
+        # Vectors that did arrive are cached above, so callers can still use them
+        if failure is not None:
+            raise failure
+        return vectors
+    
+    def _fallback_vectors(self, texts: list[str]) -> list[list[float]]:
+        """Cached vectors where available, dummy vectors for the rest."""
         vectors = []
         for text in texts:
-            try:
-                # Wait for rate limiter
-                await _global_rate_limiter.wait_if_needed()
-                
-                result = genai.embed_content(
-                    model="models/text-embedding-004",
-                    content=text,
-                    task_type="retrieval_document"
-                )
-                vectors.append(result['embedding'])
-            except google.api_core.exceptions.ResourceExhausted as e:
-                if self._logger:
-                    self._logger.warning(f"Embedding rate limited for text: {text[:50]}...")
-                # Fallback to dummy vector for rate limited requests
-                vectors.append([0.1] * 768)
-            except Exception as e:
-                if self._logger:
-                    self._logger.warning(f"Embedding failed for text: {text[:50]}..., error: {e}")
-                # Fallback to dummy vector
-                vectors.append([0.1] * 768)
+            cached = _embedding_cache.get(text)
+            vectors.append(cached.tolist() if cached is not None else [0.1] * 768)
+        return vectors
+    
+    async def embed(self, texts: list[str], hints: Mapping[str, Any] = {}) -> p.EmbeddingResult:
+        try:
+            # Lists of Python floats only at the Parlant boundary
+            vectors = (await self.embed_batch(texts)).tolist()
+        except google.api_core.exceptions.ResourceExhausted as e:
+            if self._logger:
+                self._logger.warning(f"Embedding rate limited for {len(texts)} texts")
+            # Fallback to dummy vectors for rate limited requests
+            vectors = self._fallback_vectors(texts)
+        except Exception as e:
+            if self._logger:
+                self._logger.warning(f"Embedding failed for {len(texts)} texts, error: {e}")
+            # Fallback to dummy vectors
+            vectors = self._fallback_vectors(texts)
         
         return p.EmbeddingResult(vectors=vectors)
     
@@ -497,47 +905,557 @@ class SimpleGeminiEmbedder(p.Embedder):
         return 2048
     
     @property
-    def tokenizer(self):
-        class SimpleTokenizer:
-            async def estimate_token_count(self, text: str) -> int:
-                return len(text) // 4
-        return SimpleTokenizer()
+    def tokenizer(self) -> GeminiTokenizer:
+        return _tokenizer
     
     @property
     def dimensions(self) -> int:
         return 768
 
+# Verdict shared by every unflagged message
+_UNFLAGGED = p.ModerationCheck(flagged=False, tags=[])
+
 class SimpleGeminiModeration(p.ModerationService):
     """Simple moderation service."""
     
     async def check(self, content: str) -> p.ModerationCheck:
         # For now, just return no flags - can be enhanced later
-        return p.ModerationCheck(flagged=False, tags=[])
+        return _UNFLAGGED
+
+@functools.lru_cache(maxsize=None)
+def _alias(t: type) -> Any:
+    """p.SchematicGenerator[t], built once per schema type.
+    
+    Generators are created unsubscripted and given this as __orig_class__, which
+    is where Parlant's SchematicGenerator.schema reads the schema type from.
+    """
+    return p.SchematicGenerator[t]
 
 class SimpleGeminiService(p.NLPService):
     """Simple working Gemini NLP service."""
     
-    def __init__(self, logger: p.Logger, model_name: str = "gemini-2.0-flash"):
+    def __init__(self, logger: p.Logger, model_name: str = GEMINI_MODEL_DEFAULT):
         self._logger = logger
         self._model_name = model_name
+        self._generators = {}
+        # Stateless services, created on first use and shared afterwards
+        self._embedder = None
+        self._moderation = None
+        
+        # Open the connection to Gemini in the background while the server
+        # finishes starting, so the first real call doesn't pay for the handshake
+        self._warmup_task = None
+        if _API_KEY:
+            try:
+                self._warmup_task = asyncio.get_running_loop().create_task(self.warmup())
+            except RuntimeError:
+                pass  # No running loop; the first request connects instead
+    
+    async def warmup(self) -> None:
+        """Make one count_tokens call to establish the channel; it costs no generation quota."""
+        try:
+            await asyncio.wait_for(_get_model(self._model_name).count_tokens_async("warmup"), timeout=10)
+        except Exception as e:
+            if self._logger:
+                self._logger.warning(f"Gemini warmup failed: {e!r}")
     
     async def get_schematic_generator(self, t: type[T]) -> p.SchematicGenerator[T]:
-        generator = SimpleGeminiGenerator[t](
-            model_name=self._model_name,
-            logger=self._logger
+        # One generator per schema type, kept for the lifetime of the service
+        if t not in self._generators:
+            generator = SimpleGeminiGenerator(
+                model_name=self._model_name,
+                logger=self._logger
+            )
+            generator.__orig_class__ = _alias(t)
+            generator.schema = t
+            self._generators[t] = generator
+        return self._generators[t]
+    
+    async def get_embedder(self) -> p.Embedder:
+        if self._embedder is None:
+            self._embedder = SimpleGeminiEmbedder(logger=self._logger)
+        return self._embedder
+    
+    async def get_moderation_service(self) -> p.ModerationService:
+        if self._moderation is None:
+            self._moderation = SimpleGeminiModeration()
+        return self._moderation
+
+def _result_to_json(result) -> tuple[str, str]:
+    """Content and GenerationInfo of a result as JSON text, for storage without pickle."""
+    return result.content.model_dump_json(), _dumps(dataclasses.asdict(result.info))
+
+def _result_from_json(schema_type: type, content: str, info: str):
+    """Rebuild a result stored by _result_to_json; raises if it no longer validates."""
+    info = _loads(info)
+    return p.SchematicGenerationResult(
+        content=schema_type.model_validate_json(content),
+        info=GenerationInfo(
+            schema_name=info["schema_name"],
+            model=info["model"],
+            duration=info["duration"],
+            usage=UsageInfo(**info["usage"])
+        )
+    )
+
+class SemanticResponseCache:
+    """Stores generation results by conversation embedding and serves near-duplicates.
+    
+    Each entry also carries a context digest (see _semantic_parts); only entries
+    with the same digest as the query are compared, so a result is never served
+    across different guidelines, customers, context variables or hints.
+    """
+    
+    def __init__(self, dimensions: int = 768, threshold: float = 0.92, max_entries: int = 10_000):
+        self._threshold = threshold
+        self._max_entries = max_entries
+        # Normalized prompt embeddings quantized to int8, one row per slot, with
+        # the per-row factor that maps them back to float; grown on demand
+        self._vectors = np.empty((0, dimensions), dtype=np.int8)
+        self._scales = np.empty(0, dtype=np.float32)
+        self._contexts = np.empty(0, dtype=np.uint64)
+        self._results = []
+        # Slot usage order, least recently used first
+        self._lru = OrderedDict()
+    
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+    
+    @classmethod
+    def _quantize(cls, vector):
+        """Normalize and quantize a vector to int8, returning it with its dequantization factor."""
+        array = cls._normalize(vector)
+        peak = float(np.max(np.abs(array)))
+        if not peak:
+            return np.zeros(array.shape, dtype=np.int8), np.float32(0.0)
+        return np.round(array * (127.0 / peak)).astype(np.int8), np.float32(peak / 127.0)
+    
+    def lookup(self, vector, context: int):
+        """Return the most similar result stored under the same context, if above the threshold."""
+        if not self._results:
+            return None
+        
+        candidates = np.flatnonzero(self._contexts[:len(self._results)] == np.uint64(context))
+        if not candidates.size:
+            return None
+        
+        # Inner product of normalized vectors is the cosine similarity. The int8
+        # dot products are summed in float32, which is exact at these magnitudes
+        # (127 * 127 * 768 < 2**24), then rescaled per row.
+        query, query_scale = self._quantize(vector)
+        scores = self._vectors[candidates] @ query.astype(np.float32)
+        scores *= self._scales[candidates] * query_scale
+        best = int(np.argmax(scores))
+        if scores[best] < self._threshold:
+            return None
+        
+        slot = int(candidates[best])
+        self._lru.move_to_end(slot)
+        return self._results[slot]
+    
+    def insert(self, vector, context: int, result) -> None:
+        """Store a result, evicting the least recently used entry when full."""
+        if len(self._results) < self._max_entries:
+            slot = len(self._results)
+            if slot == len(self._vectors):
+                capacity = min(max(64, 2 * slot), self._max_entries)
+                grown = np.empty((capacity, self._vectors.shape[1]), dtype=np.int8)
+                grown[:slot] = self._vectors[:slot]
+                self._vectors = grown
+                scales = np.empty(capacity, dtype=np.float32)
+                scales[:slot] = self._scales[:slot]
+                self._scales = scales
+                contexts = np.empty(capacity, dtype=np.uint64)
+                contexts[:slot] = self._contexts[:slot]
+                self._contexts = contexts
+            self._results.append(result)
+        else:
+            slot, _ = self._lru.popitem(last=False)
+            self._results[slot] = result
+        
+        self._vectors[slot], self._scales[slot] = self._quantize(vector)
+        self._contexts[slot] = context
+        self._lru[slot] = None
+    
+    def snapshot(self) -> dict | None:
+        """Copy the entries, least recently used first, into the arrays save() writes.
+        
+        Results are stored as JSON strings, so loading needs no pickle. The copy
+        is independent of the cache, so it can be written from another thread.
+        """
+        if not self._results:
+            return None
+        
+        order = list(self._lru)
+        contents, infos = zip(*(_result_to_json(self._results[slot]) for slot in order))
+        return {
+            "vectors": self._vectors[order],
+            "scales": self._scales[order],
+            "contexts": self._contexts[order],
+            "contents": np.array(contents),
+            "infos": np.array(infos),
+        }
+    
+    @staticmethod
+    def write(path: str, arrays: dict) -> None:
+        """Write a snapshot beside the target and move it into place, never half-written."""
+        temp_path = f"{path}.tmp.npz"
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, path)
+    
+    def save(self, path: str) -> None:
+        """Write the entries to an .npz file."""
+        arrays = self.snapshot()
+        if arrays is not None:
+            self.write(path, arrays)
+    
+    def load(self, path: str, schema_type: type) -> None:
+        """Restore entries written by save(), skipping any that no longer validate."""
+        with np.load(path) as data:
+            # Files written before entries carried a context can't be matched safely
+            if "contexts" not in data.files:
+                return
+            vectors, scales, contexts = data["vectors"], data["scales"], data["contexts"]
+            rows = zip(vectors, scales, contexts, data["contents"], data["infos"])
+            for vector, scale, context, content, info in rows:
+                if len(self._results) == self._max_entries:
+                    break
+                try:
+                    result = _result_from_json(schema_type, str(content), str(info))
+                except Exception:
+                    continue
+                # Rows are already quantized; dequantize so insert() can re-store them
+                self.insert(vector.astype(np.float32) * scale, int(context), result)
+
+class ExactResponseCache:
+    """LRU cache of generation results keyed by a digest of the full request, with a TTL."""
+    
+    def __init__(self, max_entries: int = 10_000, ttl: float = 3600.0):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries = OrderedDict()
+    
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        stored_at, result = entry
+        if time.monotonic() - stored_at > self._ttl:
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return result
+    
+    def put(self, key: str, result) -> None:
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+class PersistentResponseCache:
+    """SQLite-backed store of generation results, so exact cache hits survive restarts."""
+    
+    def __init__(self, path: str, ttl: float = 86400.0):
+        self._ttl = ttl
+        # Queries run on one worker thread that owns the connection, so they
+        # never block the event loop and never run concurrently
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gemini-response-cache")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, content TEXT NOT NULL, info TEXT NOT NULL)"
         )
-        generator.__orig_class__ = p.SchematicGenerator[t]
-        return generator
+        # Rows past their TTL are never served again; drop them so the file
+        # doesn't grow without bound across restarts
+        self._db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - ttl,))
+        self._db.commit()
+    
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    
+    def _fetch(self, key: str):
+        return self._db.execute(
+            "SELECT stored_at, content, info FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+    
+    def _store(self, row: tuple) -> None:
+        self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", row)
+        self._db.commit()
+    
+    async def get(self, key: str, schema_type: type):
+        row = await self._run(self._fetch, key)
+        if row is None:
+            return None
+        
+        stored_at, content, info = row
+        if time.time() - stored_at > self._ttl:
+            return None
+        
+        # Rows are plain JSON rather than pickles; one that no longer validates
+        # (the schema changed since it was written) is treated as a miss
+        try:
+            return _result_from_json(schema_type, content, info)
+        except Exception:
+            return None
+    
+    async def put(self, key: str, result) -> None:
+        await self._run(self._store, (key, time.time(), *_result_to_json(result)))
+
+# New semantic entries between writes of a persisted cache
+_SEMANTIC_SAVE_EVERY = 16
+
+# Trailing characters of the conversation that are embedded for a semantic
+# lookup; the latest messages are the ones that decide the reply
+_SEMANTIC_TEXT_CHARS = 4000
+
+def _semantic_parts(prompt, hints: Mapping[str, Any]):
+    """Split a prompt into a context digest and the conversation text to embed.
+    
+    Only the interaction history is compared by similarity. Every other section
+    (agent and customer identity, guidelines, context variables, tools...) and
+    the hints are hashed into the digest, which must match exactly. Returns None
+    when the prompt has no interaction history to compare.
+    """
+    if not isinstance(prompt, p.PromptBuilder):
+        return None
+    history = prompt.sections.get(BuiltInSection.INTERACTION_HISTORY)
+    if history is None:
+        return None
+    
+    digest = hashlib.blake2b(_canonical_json(dict(hints)), digest_size=8)
+    try:
+        for name, section in prompt.sections.items():
+            if section is not history:
+                digest.update(f"\0{name}\0".encode())
+                digest.update(section.template.format(**section.props).encode())
+        text = history.template.format(**history.props)
+    except Exception:
+        return None
+    if not text.strip():
+        return None
+    return int.from_bytes(digest.digest(), "little"), text[-_SEMANTIC_TEXT_CHARS:]
+
+class SemanticCachingGenerator(p.SchematicGenerator[T], Generic[T]):
+    """Schematic generator that answers paraphrased prompts from a semantic cache."""
+    
+    def __init__(
+        self,
+        generator: SimpleGeminiGenerator[T],
+        embedder: SimpleGeminiEmbedder,
+        cache: SemanticResponseCache | None,
+        exact_cache: ExactResponseCache,
+        logger: p.Logger = None,
+        store: PersistentResponseCache = None,
+        cache_path: str = None,
+    ):
+        self._generator = generator
+        self._embedder = embedder
+        self._cache = cache
+        self._exact_cache = exact_cache
+        self._logger = logger
+        self._store = store
+        # Semantic entries are written to cache_path every _SEMANTIC_SAVE_EVERY inserts
+        self._cache_path = cache_path
+        self._unsaved = 0
+        self._save_task = None
+    
+    def _cache_key(self, prompt_text: str, hints: Mapping[str, Any]) -> str:
+        payload = _canonical_json(
+            {
+                # Qualified, so same-named models in different modules don't share entries
+                "schema": f"{self.schema.__module__}.{self.schema.__qualname__}",
+                "model": self._generator.id,
+                "prompt": prompt_text,
+                "hints": dict(hints),
+            }
+        )
+        return hashlib.sha256(payload).hexdigest()
+    
+    async def generate(
+        self,
+        prompt: str | p.PromptBuilder,
+        hints: Mapping[str, Any] = {},
+    ) -> p.SchematicGenerationResult[T]:
+        """Return a cached result for identical or similar prompts, generating on a miss."""
+        if isinstance(prompt, p.PromptBuilder):
+            prompt_text = prompt.build()
+        else:
+            prompt_text = prompt
+        
+        # L1: exact match on the full request, no embedding needed
+        key = self._cache_key(prompt_text, hints)
+        cached = self._exact_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # L1 on disk: results from earlier runs, promoted into memory on a hit
+        if self._store is not None:
+            cached = await self._store.get(key, self.schema)
+            if cached is not None:
+                self._exact_cache.put(key, cached)
+                return cached
+        
+        # L2 needs the conversation embedded, which costs a request of its own;
+        # skip it once the daily quota is gone, since nothing could be stored
+        vector = parts = None
+        if self._cache is not None and not _global_rate_limiter.daily_quota_exhausted:
+            parts = _semantic_parts(prompt, hints)
+        if parts is not None:
+            context, text = parts
+            try:
+                [vector] = await self._embedder.embed_batch([text])
+            except Exception as e:
+                # Without a real embedding the semantic cache can't be consulted safely
+                if self._logger:
+                    self._logger.warning(f"Semantic cache bypassed, prompt embedding failed: {e}")
+        
+        # L2: semantic match, backfilling L1 so the next identical prompt is O(1)
+        if vector is not None:
+            cached = self._cache.lookup(vector, context)
+            if cached is not None:
+                self._exact_cache.put(key, cached)
+                return cached
+        
+        result = await self._generator.generate(prompt_text, hints)
+        
+        # Never serve fallback responses from the cache
+        if not result.info.model.endswith("_fallback"):
+            self._exact_cache.put(key, result)
+            if self._store is not None:
+                await self._store.put(key, result)
+            if vector is not None:
+                self._cache.insert(vector, context, result)
+                self._save_if_due()
+        
+        return result
+    
+    def _save_if_due(self) -> None:
+        if self._cache_path is None:
+            return
+        self._unsaved += 1
+        # While a write is still in flight the count keeps growing, and the
+        # next insert after it finishes saves everything at once
+        if self._unsaved < _SEMANTIC_SAVE_EVERY or (self._save_task and not self._save_task.done()):
+            return
+        self._unsaved = 0
+        # Snapshot on the loop, so the thread never sees the cache mid-update
+        self._save_task = asyncio.create_task(self._write_cache(self._cache.snapshot()))
+    
+    async def _write_cache(self, arrays: dict) -> None:
+        try:
+            await asyncio.to_thread(SemanticResponseCache.write, self._cache_path, arrays)
+        except Exception as e:
+            if self._logger:
+                self._logger.warning(f"Saving semantic cache to {self._cache_path} failed: {e}")
+    
+    def save_cache(self) -> None:
+        """Persist the semantic cache, if a path was configured; failures are only logged."""
+        if self._cache is None or self._cache_path is None:
+            return
+        try:
+            self._cache.save(self._cache_path)
+        except Exception as e:
+            if self._logger:
+                self._logger.warning(f"Saving semantic cache to {self._cache_path} failed: {e}")
+    
+    @property
+    def id(self) -> str:
+        return self._generator.id
+    
+    @property
+    def max_tokens(self) -> int:
+        return self._generator.max_tokens
+    
+    @property
+    def tokenizer(self):
+        return self._generator.tokenizer
+
+class SemanticCachingNLPService(p.NLPService):
+    """Gemini NLP service whose schematic generators are fronted by exact and semantic caches."""
+    
+    def __init__(
+        self,
+        service: SimpleGeminiService,
+        logger: p.Logger = None,
+        store: PersistentResponseCache = None,
+        semantic: bool = False,
+        cache_dir: str = None,
+    ):
+        self._service = service
+        self._logger = logger
+        self._store = store
+        # Without the semantic tier only exact repeats are cached, and prompts
+        # are never embedded; cache_dir keeps its entries across restarts
+        self._semantic = semantic
+        self._cache_dir = cache_dir
+        self._generators = {}
+    
+    def _semantic_cache(self, t: type, cache_path: str | None) -> SemanticResponseCache | None:
+        if not self._semantic:
+            return None
+        cache = SemanticResponseCache()
+        if cache_path and os.path.exists(cache_path):
+            try:
+                cache.load(cache_path, t)
+            except Exception as e:
+                if self._logger:
+                    self._logger.warning(f"Ignoring unreadable semantic cache {cache_path}: {e}")
+        return cache
+    
+    async def get_schematic_generator(self, t: type[T]) -> p.SchematicGenerator[T]:
+        # One cache per schema type, kept for the lifetime of the service
+        if t not in self._generators:
+            cache_path = None
+            if self._semantic and self._cache_dir:
+                cache_path = os.path.join(self._cache_dir, f"semcache-{t.__module__}.{t.__qualname__}.npz")
+            generator = SemanticCachingGenerator(
+                generator=await self._service.get_schematic_generator(t),
+                embedder=await self._service.get_embedder(),
+                cache=self._semantic_cache(t, cache_path),
+                exact_cache=ExactResponseCache(),
+                logger=self._logger,
+                store=self._store,
+                cache_path=cache_path
+            )
+            generator.__orig_class__ = _alias(t)
+            generator.schema = t
+            if cache_path:
+                # Entries added since the last periodic write survive a clean exit
+                atexit.register(generator.save_cache)
+            self._generators[t] = generator
+        return self._generators[t]
     
     async def get_embedder(self) -> p.Embedder:
-        return SimpleGeminiEmbedder(logger=self._logger)
+        return await self._service.get_embedder()
     
     async def get_moderation_service(self) -> p.ModerationService:
-        return SimpleGeminiModeration()
+        return await self._service.get_moderation_service()
 
 def load_gemini_nlp_service(container: p.Container) -> p.NLPService:
     """Create the Gemini NLP service."""
     return SimpleGeminiService(
         logger=container[p.Logger],
-        model_name=os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+        model_name=_MODEL_NAME
+    )
+
+def load_cached_gemini_nlp_service(container: p.Container) -> p.NLPService:
+    """Create the Gemini NLP service wrapped in a semantic response cache."""
+    # Set GEMINI_RESPONSE_CACHE_PATH to keep exact cache hits across restarts,
+    # GEMINI_SEMANTIC_CACHE=1 to also serve similar conversations (off by
+    # default: only exact repeats are cached), and GEMINI_SEMANTIC_CACHE_DIR
+    # (e.g. parlant-data) to persist semantic entries
+    store_path = os.environ.get("GEMINI_RESPONSE_CACHE_PATH")
+    return SemanticCachingNLPService(
+        service=load_gemini_nlp_service(container),
+        logger=container[p.Logger],
+        store=PersistentResponseCache(store_path) if store_path else None,
+        semantic=os.environ.get("GEMINI_SEMANTIC_CACHE", "0") == "1",
+        cache_dir=os.environ.get("GEMINI_SEMANTIC_CACHE_DIR")
     )
@@ -5,6 +5,12 @@ from dotenv import load_dotenv
 from gemini_service import load_gemini_nlp_service
 from datetime import datetime
 
+# Optional faster event loop; asyncio's default loop is used when it isn't installed
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 load_dotenv()
 
 @p.tool
@@ -47,24 +53,32 @@ async def get_lab_results(context: p.ToolContext) -> p.ToolResult:
     )
 
 
-async def add_domain_glossary(agent: p.Agent) -> None:
-    await agent.create_term(
-        name="Office Phone Number",
-        description="The phone number of our office, at +1-234-567-8900",
-    )
-
-    await agent.create_term(
-        name="Office Hours",
-        description="Office hours are Monday to Friday, 9 AM to 5 PM",
-    )
+# Glossary terms, defined once at import
+TERMS = (
+    {
+        "name": "Office Phone Number",
+        "description": "The phone number of our office, at +1-234-567-8900",
+    },
+    {
+        "name": "Office Hours",
+        "description": "Office hours are Monday to Friday, 9 AM to 5 PM",
+    },
+    {
+        "name": "Charles Xavier",
+        "synonyms": ["Professor X"],
+        "description": "The doctor who specializes in neurology and is available on Mondays and Tuesdays.",
+    },
+    # Add other specific terms and definitions here, as needed...
+)
 
-    await agent.create_term(
-        name="Charles Xavier",
-        synonyms=["Professor X"],
-        description="The doctor who specializes in neurology and is available on Mondays and Tuesdays.",
-    )
 
-    # Add other specific terms and definitions here, as needed...
+async def add_domain_glossary(agent: p.Agent) -> None:
+    # Terms are independent, so create them concurrently. Parlant's glossary
+    # store still embeds them one at a time. If one fails the rest are
+    # cancelled instead of left half-created
+    async with asyncio.TaskGroup() as tg:
+        for term in TERMS:
+            tg.create_task(agent.create_term(**term))
 
 
 # <<Add this function>>
@@ -138,20 +152,21 @@ async def create_lab_results_journey(server: p.Server, agent: p.Agent) -> p.Jour
 
     t0 = await journey.initial_state.transition_to(tool_state=get_lab_results)
 
-    await t0.target.transition_to(
-        chat_state="Tell the patient that the results are not available yet, and to try again later",
-        condition="The lab results could not be found",
-    )
-
-    await t0.target.transition_to(
-        chat_state="Explain the lab results to the patient - that they are normal",
-        condition="The lab results are good - i.e., nothing to worry about",
-    )
-
-    await t0.target.transition_to(
-        chat_state="Present the results and ask them to call the office "
-        "for clarifications on the results as you are not a doctor",
-        condition="The lab results are not good - i.e., there's an issue with the patient's health",
+    # The three outcomes branch from the same state, so add them concurrently
+    await asyncio.gather(
+        t0.target.transition_to(
+            chat_state="Tell the patient that the results are not available yet, and to try again later",
+            condition="The lab results could not be found",
+        ),
+        t0.target.transition_to(
+            chat_state="Explain the lab results to the patient - that they are normal",
+            condition="The lab results are good - i.e., nothing to worry about",
+        ),
+        t0.target.transition_to(
+            chat_state="Present the results and ask them to call the office "
+            "for clarifications on the results as you are not a doctor",
+            condition="The lab results are not good - i.e., there's an issue with the patient's health",
+        ),
     )
 
     # Handle edge cases with guidelines...
@@ -210,4 +225,4 @@ async def main() -> None:
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None)
\ No newline at end of file
@@ -0,0 +1,385 @@
+"""Unit tests for gemini_service.
+
+Nothing here reaches the Gemini API; async code is driven with asyncio.run,
+so only pytest is needed.
+"""
+
+import asyncio
+
+import numpy as np
+import pydantic
+import pytest
+import google.api_core.exceptions
+from google.protobuf import duration_pb2
+from google.rpc import error_details_pb2
+import parlant.sdk as p
+from parlant.core.engines.alpha.prompt_builder import BuiltInSection
+from parlant.core.nlp.generation_info import GenerationInfo, UsageInfo
+
+import gemini_service as g
+
+ResourceExhausted = google.api_core.exceptions.ResourceExhausted
+
+
+class Reply(pydantic.BaseModel):
+    text: str
+    tags: list[str] = []
+
+
+_INFO = GenerationInfo(
+    schema_name="Reply",
+    model="gemini-test",
+    duration=0.1,
+    usage=UsageInfo(input_tokens=1, output_tokens=1),
+)
+
+
+def _result(text: str) -> p.SchematicGenerationResult:
+    return p.SchematicGenerationResult(content=Reply(text=text), info=_INFO)
+
+
+def _quota_error(quota_id: str, retry_seconds: int = 0) -> ResourceExhausted:
+    violation = error_details_pb2.QuotaFailure.Violation(quota_id=quota_id)
+    retry = error_details_pb2.RetryInfo(retry_delay=duration_pb2.Duration(seconds=retry_seconds))
+    return ResourceExhausted(
+        "Quota exceeded", details=[error_details_pb2.QuotaFailure(violations=[violation]), retry]
+    )
+
+
+def _prompt(guideline: str, message: str) -> p.PromptBuilder:
+    builder = p.PromptBuilder()
+    builder.add_section("guidelines", "Follow: {guideline}", props={"guideline": guideline})
+    builder.add_section(BuiltInSection.INTERACTION_HISTORY, "customer: {message}", props={"message": message})
+    return builder
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """A fresh, generous global rate limiter, so tests never share quota state."""
+    fresh = g.RateLimiter(calls_per_minute=1000, calls_per_day=1000)
+    monkeypatch.setattr(g, "_global_rate_limiter", fresh)
+    return fresh
+
+
+# RateLimiter
+
+def test_token_bucket_refills_over_time():
+    limiter = g.RateLimiter(calls_per_minute=2, calls_per_day=100)
+    now = limiter.last_refill
+    assert limiter._try_acquire(now) is None
+    assert limiter._try_acquire(now) is None
+    assert limiter._try_acquire(now) == pytest.approx(30.0)
+    assert limiter._try_acquire(now + 30.0) is None
+
+
+def test_day_window_exhausts_the_quota_until_it_has_room():
+    limiter = g.RateLimiter(calls_per_minute=100, calls_per_day=2)
+    now = limiter.last_refill
+    limiter._try_acquire(now)
+    limiter._try_acquire(now + 1.0)
+    with pytest.raises(ResourceExhausted, match="Daily quota exceeded"):
+        limiter._try_acquire(now + 2.0)
+    assert limiter.daily_quota_exhausted
+    with pytest.raises(ResourceExhausted, match="already exhausted"):
+        limiter._try_acquire(now + 86399.0)
+    # The first admission has aged out, so there is room again
+    assert limiter._try_acquire(now + 86400.0) is None
+    assert not limiter.daily_quota_exhausted
+
+
+def test_server_reported_exhaustion_clears_after_a_day():
+    limiter = g.RateLimiter(calls_per_minute=100, calls_per_day=100)
+    limiter.mark_quota_exhausted()
+    now = g.time.monotonic()
+    with pytest.raises(ResourceExhausted, match="already exhausted"):
+        limiter._try_acquire(now)
+    assert limiter._try_acquire(now + 86400.0) is None
+
+
+def test_day_window_prunes_admissions_older_than_a_day():
+    limiter = g.RateLimiter(calls_per_minute=100, calls_per_day=2)
+    now = limiter.last_refill
+    limiter._try_acquire(now)
+    limiter._try_acquire(now + 1.0)
+    assert limiter._try_acquire(now + 86400.0) is None
+    assert limiter.day_count == 2
+
+
+def test_sleeping_callers_see_exhaustion():
+    limiter = g.RateLimiter(calls_per_minute=600, calls_per_day=100)
+    limiter.tokens = 0.0
+
+    async def scenario():
+        waiter = asyncio.create_task(limiter.wait_if_needed())
+        await asyncio.sleep(0)
+        limiter.mark_quota_exhausted()
+        await waiter
+
+    with pytest.raises(ResourceExhausted):
+        asyncio.run(scenario())
+
+
+# Retry and quota classification
+
+def test_daily_quota_is_read_from_quota_failure(limiter):
+    assert g._is_daily_quota_error(_quota_error("GenerateRequestsPerDayPerProjectPerModel-FreeTier"))
+    assert not g._is_daily_quota_error(_quota_error("GenerateRequestsPerMinutePerProjectPerModel-FreeTier"))
+    assert not g._is_daily_quota_error(ResourceExhausted("Try again later today"))
+
+
+def test_retry_delay_honors_retry_info():
+    delay = g._retry_delay(_quota_error("PerMinute", retry_seconds=10), attempt=0)
+    assert 8.0 <= delay <= 12.0
+
+
+def test_call_with_retry_fails_fast_on_daily_quota(limiter):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise _quota_error("GenerateRequestsPerDayPerProjectPerModel-FreeTier")
+
+    with pytest.raises(ResourceExhausted):
+        asyncio.run(g._call_with_retry(call))
+    assert calls == [1]
+    assert limiter.daily_quota_exhausted
+
+
+def test_call_with_retry_retries_transient_errors(limiter, monkeypatch):
+    monkeypatch.setattr(g, "_backoff_delay", lambda attempt, base_delay=1.0: 0.0)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) < 3:
+            raise google.api_core.exceptions.ServiceUnavailable("try again")
+        return "ok"
+
+    assert asyncio.run(g._call_with_retry(call, max_retries=3)) == "ok"
+    assert len(calls) == 3
+
+
+def test_call_with_retry_retries_per_minute_quota(limiter):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _quota_error("GenerateRequestsPerMinutePerProjectPerModel-FreeTier")
+        return "ok"
+
+    assert asyncio.run(g._call_with_retry(call, max_retries=3)) == "ok"
+    assert len(calls) == 3
+    assert not limiter.daily_quota_exhausted
+
+
+def test_env_int_falls_back_and_clamps(monkeypatch):
+    monkeypatch.setenv("GEMINI_TEST_LIMIT", "3")
+    assert g._env_int("GEMINI_TEST_LIMIT", 8) == 3
+    monkeypatch.setenv("GEMINI_TEST_LIMIT", "many")
+    with pytest.warns(UserWarning):
+        assert g._env_int("GEMINI_TEST_LIMIT", 8) == 8
+    monkeypatch.setenv("GEMINI_TEST_LIMIT", "0")
+    with pytest.warns(UserWarning):
+        assert g._env_int("GEMINI_TEST_LIMIT", 8) == 1
+
+
+# Generation
+
+class _FakeModel:
+    """Stands in for a GenerativeModel, answering every request with the same text."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.calls += 1
+        return _FakeResponse(self.text)
+
+
+class _FakeResponse:
+    usage_metadata = None
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _caching_generator(monkeypatch, model):
+    monkeypatch.setattr(g, "_API_KEY", "test-key")
+    monkeypatch.setattr(g, "_get_model", lambda model_name: model)
+    generator = g.SimpleGeminiGenerator[Reply](model_name="gemini-test")
+    return g.SemanticCachingGenerator[Reply](
+        generator, embedder=None, cache=None, exact_cache=g.ExactResponseCache()
+    )
+
+
+def test_unparseable_reply_falls_back_and_is_not_cached(limiter, monkeypatch):
+    monkeypatch.setattr(g, "_backoff_delay", lambda attempt, base_delay=1.0: 0.0)
+    model = _FakeModel("Sorry, I can't help with that")
+    generator = _caching_generator(monkeypatch, model)
+
+    async def generate_twice():
+        return [await generator.generate("hello") for _ in range(2)]
+
+    first, second = asyncio.run(generate_twice())
+    assert first.info.model == "gemini-test_fallback"
+    assert second.info.model == "gemini-test_fallback"
+    # Each generate() retries the reply before giving up on it
+    assert model.calls == 6
+
+
+def test_schema_mismatch_is_retried_before_falling_back(limiter, monkeypatch):
+    monkeypatch.setattr(g, "_backoff_delay", lambda attempt, base_delay=1.0: 0.0)
+    model = _FakeModel('{"tags": ["no text"]}')
+    generator = _caching_generator(monkeypatch, model)
+
+    result = asyncio.run(generator.generate("hello"))
+    assert result.info.model == "gemini-test_fallback"
+    assert model.calls == 3
+
+
+# JSON repair
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"text": "hel', {"text": "hel"}),
+        ('{"text": "hi", "tags": ["a", "b"', {"text": "hi", "tags": ["a", "b"]}),
+        ('Sure! {"text": "hi",', {"text": "hi"}),
+        ("no json here", None),
+    ],
+)
+def test_repair_json_closes_truncated_replies(text, expected):
+    assert g._repair_json(text) == expected
+
+
+# Embedding cache
+
+def test_embedding_cache_evicts_least_recently_used():
+    cache = g.EmbeddingCache(max_entries=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    assert cache.get("c") == [3.0]
+
+
+# Semantic cache
+
+def test_semantic_parts_split_context_from_conversation():
+    context, text = g._semantic_parts(_prompt("be brief", "hello"), {})
+    assert text == "customer: hello"
+    assert g._semantic_parts(_prompt("be verbose", "hello"), {})[0] != context
+    assert g._semantic_parts(_prompt("be brief", "hello"), {"temperature": 0})[0] != context
+    assert g._semantic_parts("plain prompt", {}) is None
+
+
+def test_semantic_lookup_only_matches_the_same_context():
+    cache = g.SemanticResponseCache(dimensions=4)
+    cache.insert([1.0, 0.0, 0.0, 0.0], 1, _result("first"))
+    assert cache.lookup([1.0, 0.05, 0.0, 0.0], 1).content.text == "first"
+    assert cache.lookup([1.0, 0.0, 0.0, 0.0], 2) is None
+    assert cache.lookup([0.0, 1.0, 0.0, 0.0], 1) is None
+
+
+def test_semantic_cache_reuses_the_least_recently_used_slot():
+    cache = g.SemanticResponseCache(dimensions=2, max_entries=2)
+    cache.insert([1.0, 0.0], 1, _result("a"))
+    cache.insert([0.0, 1.0], 1, _result("b"))
+    cache.lookup([1.0, 0.0], 1)
+    cache.insert([-1.0, 0.0], 1, _result("c"))
+    assert len(cache._results) == 2
+    assert cache.lookup([0.0, 1.0], 1) is None
+    assert cache.lookup([1.0, 0.0], 1).content.text == "a"
+    assert cache.lookup([-1.0, 0.0], 1).content.text == "c"
+
+
+def test_quantized_similarity_tracks_cosine():
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(size=768), rng.normal(size=768)
+    (qa, sa), (qb, sb) = g.SemanticResponseCache._quantize(a), g.SemanticResponseCache._quantize(b)
+    cosine = a @ b / (np.linalg.norm(a) * np.linalg.norm(b))
+    assert float(qa.astype(np.float32) @ qb.astype(np.float32) * sa * sb) == pytest.approx(cosine, abs=0.01)
+
+
+def test_semantic_cache_roundtrips_through_npz(tmp_path):
+    path = str(tmp_path / "semcache.npz")
+    cache = g.SemanticResponseCache(dimensions=2)
+    cache.insert([1.0, 0.0], 2**63 + 1, _result("a"))
+    cache.insert([0.0, 1.0], 7, _result("b"))
+    cache.save(path)
+
+    restored = g.SemanticResponseCache(dimensions=2)
+    restored.load(path, Reply)
+    assert restored.lookup([1.0, 0.0], 2**63 + 1).content.text == "a"
+    assert restored.lookup([0.0, 1.0], 7).content.text == "b"
+    assert restored.lookup([0.0, 1.0], 2**63 + 1) is None
+
+
+def test_semantic_cache_ignores_files_without_contexts(tmp_path):
+    path = str(tmp_path / "old.npz")
+    np.savez(path, vectors=np.zeros((1, 2), dtype=np.int8), scales=np.ones(1, dtype=np.float32))
+    cache = g.SemanticResponseCache(dimensions=2)
+    cache.load(path, Reply)
+    assert not cache._results
+
+
+# Exact and persistent caches
+
+def test_exact_cache_expires_entries(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(g.time, "monotonic", lambda: clock[0])
+    cache = g.ExactResponseCache(ttl=10.0)
+    cache.put("key", _result("a"))
+    assert cache.get("key").content.text == "a"
+    clock[0] += 11.0
+    assert cache.get("key") is None
+
+
+def test_persistent_cache_roundtrip_and_expiry_purge(tmp_path):
+    path = str(tmp_path / "responses.db")
+
+    async def store():
+        cache = g.PersistentResponseCache(path, ttl=60.0)
+        await cache.put("fresh", _result("a"))
+        await cache.put("stale", _result("b"))
+        cache._db.execute("UPDATE responses SET stored_at = 0 WHERE key = 'stale'")
+        cache._db.commit()
+        return await cache.get("fresh", Reply), await cache.get("stale", Reply)
+
+    fresh, stale = asyncio.run(store())
+    assert fresh.content.text == "a"
+    assert stale is None
+
+    reopened = g.PersistentResponseCache(path, ttl=60.0)
+    keys = [key for (key,) in reopened._db.execute("SELECT key FROM responses")]
+    assert keys == ["fresh"]
+
+
+# Prompt scaffolds
+
+def test_scaffold_uses_examples_declared_on_the_schema():
+    class Greeting(pydantic.BaseModel):
+        model_config = pydantic.ConfigDict(json_schema_extra={"examples": [{"text": "Hello!"}]})
+        text: str
+
+    class Mood(pydantic.BaseModel):
+        mood: str = pydantic.Field(examples=["cheerful"])
+
+    dummy_instance, instructions = g._schema_scaffold(Greeting)
+    assert dummy_instance == {"text": "Hello!"}
+    assert "Hello!" in instructions
+    assert g._schema_scaffold(Mood)[0] == {"mood": "cheerful"}
+
+
+def test_scaffold_skips_examples_that_do_not_validate():
+    class Scored(pydantic.BaseModel):
+        model_config = pydantic.ConfigDict(json_schema_extra={"examples": [{"score": "high"}]})
+        score: int = pydantic.Field(examples=["high"])
+
+    dummy_instance, instructions = g._schema_scaffold(Scored)
+    assert dummy_instance == {"score": 1}
+    assert '"score"' in instructions